@@ -1,11 +1,34 @@
 import tkinter as tk
+import tkinter.filedialog
 import math
 import random
+import re
+
+from sparse_table import SparseTable, load_numpy
 
 x_away = 2000
 y_away = 2000
 
 
+def parse_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def read_numbers_file(path):
+    if path.endswith(".npy"):
+        np = load_numpy()
+        if np is None:
+            raise ValueError("Для чтения .npy требуется numpy")
+        return np.load(path).ravel().tolist()
+
+    #CSV или текст: числа через запятую, точку с запятой или пробельные символы
+    with open(path) as file:
+        return [parse_number(token) for token in re.split(r"[\s,;]+", file.read()) if token]
+
+
 def get_color_by_state(state):
     if state == "inactive":
         return "#cfcfcf"
@@ -21,52 +44,6 @@ def get_color_by_state(state):
         return "#b5c1ff"
 
 
-class SparseTable:
-    def __init__(self, array):
-        self.columns_number = len(array)
-        self.rows_number = int(math.log2(self.columns_number)) + 1
-        self.logs = self._calculate_logs()
-        self.table = self._build_sparse_table(array)
-
-    def get_shapes(self):
-        return self.rows_number, self.columns_number
-
-    def get_cell_value(self, row, column):
-        return self.table[row][column]
-
-    def get_log_by_length(self, section_length):
-        return self.logs[section_length]
-
-    def get_minimum(self, index1, index2):
-        if index1 > index2:
-            index1, index2 = index2, index1
-
-        section_length = index2 - index1 + 1
-        return min(self.table[self.logs[section_length]][index1],
-                   self.table[self.logs[section_length]][index2 - (1 << self.logs[section_length]) + 1])
-
-    def _calculate_logs(self):
-        logs = [0, 0]
-        for i in range(2, self.columns_number + 1):
-            logs.append(logs[i // 2] + 1)
-        return logs
-
-    def _build_sparse_table(self, array):
-        table = [[None for g in range(self.columns_number)] for i in range(self.rows_number)]
-
-        for i in range(self.columns_number):
-            table[0][i] = array[i]
-
-        for row in range(1, self.rows_number):
-            for column in range(self.columns_number):
-                if column + (1 << row) > self.columns_number:
-                    break
-
-                table[row][column] = min(table[row - 1][column], table[row - 1][column + (1 << (row - 1))])
-
-        return table
-
-
 class NumberTile:
     def __init__(self, number, state="inactive"):
         self.number = number
@@ -78,14 +55,20 @@ class NumberTile:
         else:
             self.state = state_to_set
 
-    def draw_on(self, surface, index, x, y, size):
-        surface.create_rectangle(x, y, x + size, y + size, fill=get_color_by_state(self.state))
-
+    def draw_on(self, surface, index, x, y, size, items=None):
         text_x = x + (size - 10*len(str(self.number))) / 2
         index_x = x + (size - 7*len(str(index))) / 2
 
-        surface.create_text(text_x, y + 0.5*size, anchor=tk.W, font="Arial 16", text=str(self.number))
-        surface.create_text(index_x, size + 10, anchor=tk.W, font="Arial 12", text=str(index))
+        if items is None:
+            return (surface.create_rectangle(x, y, x + size, y + size, fill=get_color_by_state(self.state)),
+                    surface.create_text(text_x, y + 0.5*size, anchor=tk.W, font="Arial 16", text=str(self.number)),
+                    surface.create_text(index_x, size + 10, anchor=tk.W, font="Arial 12", text=str(index)))
+
+        rectangle, text_item, index_item = items
+        surface.itemconfig(rectangle, fill=get_color_by_state(self.state))
+        surface.coords(text_item, text_x, y + 0.5*size)
+        surface.itemconfig(text_item, text=str(self.number))
+        return items
 
 
 class ArrayCanvas(tk.Canvas):
@@ -115,6 +98,13 @@ class ArrayCanvas(tk.Canvas):
         self.tile_size = kwargs["height"] - 20
         self.last_x = 0
 
+        #Элементы холста для каждой плитки и плитки, которые нужно перерисовать в следующем кадре
+        self.tile_items = []
+        self.dirty_tiles = set()
+        self.highlighted_tiles = set()
+        self.pending_motion_x = None
+        self.repaint_job = None
+
     def bind_widgets(self):
         self.entry.bind("<Return>", self.process_enter_button)
         self.scroll_bar.bind("<B1-Motion>", self.process_scroll_move)
@@ -139,23 +129,63 @@ class ArrayCanvas(tk.Canvas):
 
     def redraw_all_tiles(self):
         self.delete("all")
-        for index, tile in enumerate(self.tiles):
-            if index == self.current_tile_index:
-                tile.draw_on(self, index, index * self.tile_size, 0, self.tile_size)
-            else:
-                tile.draw_on(self, index, index * self.tile_size, 0, self.tile_size)
-        self.config(scrollregion=self.bbox("all"))
+        self.tile_items = [tile.draw_on(self, index, index * self.tile_size, 0, self.tile_size)
+                           for index, tile in enumerate(self.tiles)]
+        self.dirty_tiles.clear()
+        self.highlighted_tiles = {index for index, tile in enumerate(self.tiles) if tile.state != "inactive"}
+        self.config(scrollregion=(0, 0, len(self.tiles) * self.tile_size, self.tile_size + 20))
+
+    def schedule_repaint(self):
+        #Все изменения за кадр перерисовываются одним вызовом repaint
+        if self.repaint_job is None:
+            self.repaint_job = self.after_idle(self.repaint)
+
+    def repaint(self):
+        self.repaint_job = None
+
+        if self.pending_motion_x is not None:
+            x = self.pending_motion_x
+            self.pending_motion_x = None
+            if self.window.can_use_canvases():
+                self.change_current_element(self._get_index_by_coords(x))
+
+        for index in self.dirty_tiles:
+            if index < len(self.tile_items):
+                self.tiles[index].draw_on(self, index, index * self.tile_size, 0, self.tile_size,
+                                          items=self.tile_items[index])
+        self.dirty_tiles.clear()
+
+    def set_tile_state(self, index, state):
+        self.tiles[index].set_state(state)
+        if self.tiles[index].state == "inactive":
+            self.highlighted_tiles.discard(index)
+        else:
+            self.highlighted_tiles.add(index)
+        self.dirty_tiles.add(index)
+        self.schedule_repaint()
 
     def add_tile(self, number=0):
         self.tiles.append(NumberTile(number))
-        self.tiles[-1].draw_on(self, len(self.tiles) - 1, self.last_x, 0, self.tile_size)
-        self.addtag_all("all")
+        self.tile_items.append(self.tiles[-1].draw_on(self, len(self.tiles) - 1, self.last_x, 0, self.tile_size))
         self.last_x += self.tile_size
-        self.config(scrollregion=self.bbox("all"))
+        self.config(scrollregion=(0, 0, self.last_x, self.tile_size + 20))
+
+        self.window.hide_sparse_table()
+
+    def set_numbers(self, numbers):
+        #Массив заменяется целиком и рисуется за один проход
+        if self.index_for_input is not None:
+            self.hide_element_entry()
+        self.tiles = [NumberTile(number) for number in numbers]
+        self.last_x = len(self.tiles) * self.tile_size
+        self.current_tile_index = None
 
         self.window.hide_sparse_table()
         self.redraw_all_tiles()
 
+    def clear(self):
+        self.set_numbers([])
+
     def delete_tile(self, index):
         if self.index_for_input is not None:
             self.hide_element_entry()
@@ -167,9 +197,7 @@ class ArrayCanvas(tk.Canvas):
         self.redraw_all_tiles()
 
     def delete_all_tiles(self):
-        tiles_number = self.get_current_size()
-        for i in range(0, tiles_number):
-            self.delete_tile(0)
+        self.clear()
 
     def show_element_entry(self, tile_index):
         if self.index_for_input is not None:
@@ -200,7 +228,8 @@ class ArrayCanvas(tk.Canvas):
                 self.window.show_error_label("Введенное значение не число!")
 
             self.tiles[self.index_for_input].number = entry_value
-            self.redraw_all_tiles()
+            self.dirty_tiles.add(self.index_for_input)
+            self.schedule_repaint()
             self.window.hide_sparse_table()
 
         self.entry.place(x=-100, y=0)
@@ -208,12 +237,10 @@ class ArrayCanvas(tk.Canvas):
         self.index_for_input = None
 
     def highlight_tile(self, index, mode):
-        self.tiles[index].set_state(mode)
-        self.tiles[index].draw_on(self, index, index * self.tile_size, 0, self.tile_size)
+        self.set_tile_state(index, mode)
 
     def unhighlight_tile(self, index):
-        self.tiles[index].set_state("inactive")
-        self.tiles[index].draw_on(self, index, index * self.tile_size, 0, self.tile_size)
+        self.set_tile_state(index, "inactive")
 
     def highlight_section(self, start_index, length, mode):
         for i in range(length):
@@ -221,7 +248,8 @@ class ArrayCanvas(tk.Canvas):
                 self.highlight_tile(start_index + i, mode)
 
     def unhighlite_all_tiles(self):
-        self.highlight_section(0, len(self.tiles), "inactive")
+        for index in list(self.highlighted_tiles):
+            self.set_tile_state(index, "inactive")
 
     def change_current_element(self, new_index):
         if self.current_tile_index is not None and self.current_tile_index < self.get_current_size():
@@ -235,7 +263,9 @@ class ArrayCanvas(tk.Canvas):
         if not self.window.can_use_canvases():
             return
 
-        self.change_current_element(self._get_index_by_coords(event.x))
+        #Серия событий движения схлопывается до последней позиции курсора
+        self.pending_motion_x = event.x
+        self.schedule_repaint()
 
     def process_scroll_move(self, event):
         self.hide_element_entry()
@@ -288,12 +318,74 @@ class TableCell:
         else:
             self.state = state_to_set
 
-    def draw_on(self, surface, x, y, size):
-        surface.create_rectangle(x, y, x + size, y + size, fill=get_color_by_state(self.state))
-
-        text = str(self.number) if self.number is not None else ""
+    def draw_on(self, surface, x, y, size, items=None, show_number=True):
+        text = str(self.number) if self.number is not None and show_number else ""
         text_x = x + (size - 8*len(str(self.number))) / 2
-        surface.create_text(text_x, y + 0.5*size, anchor=tk.W, font="Arial 12", text=text)
+
+        if items is None:
+            return (surface.create_rectangle(x, y, x + size, y + size, fill=get_color_by_state(self.state)),
+                    surface.create_text(text_x, y + 0.5*size, anchor=tk.W, font="Arial 12", text=text))
+
+        # Переиспользуем уже созданные элементы холста вместо создания новых
+        rectangle, text_item = items
+        surface.coords(rectangle, x, y, x + size, y + size)
+        surface.itemconfig(rectangle, fill=get_color_by_state(self.state), state="normal")
+        surface.coords(text_item, text_x, y + 0.5*size)
+        surface.itemconfig(text_item, text=text, state="normal")
+        return items
+
+
+class BuildTimeline:
+    #Шаг step заполняет клетку (step // columns_number, step % columns_number), поэтому шаги
+    #не хранятся, а вычисляются по номеру, и переход к любому шагу занимает O(1)
+    def __init__(self, sparse_table):
+        self.sparse_table = sparse_table
+        self.rows_number, self.columns_number = sparse_table.get_shapes()
+
+    def __len__(self):
+        return self.rows_number * self.columns_number
+
+    def get_step_number(self, row, column):
+        return row * self.columns_number + column
+
+    def get_level_start(self, row):
+        return row * self.columns_number
+
+    def get_step(self, step):
+        row, column = divmod(step, self.columns_number)
+
+        left_child_start = None
+        right_child_start = None
+        if row > 0 and self.columns_number - (1 << row) >= column:
+            left_child_start = column
+            right_child_start = column + (1 << (row - 1))
+
+        return {"row": row,
+                "column": column,
+                "left_start": left_child_start,
+                "right_start": right_child_start,
+                "parent_row": row - 1}
+
+    def get_message(self, step):
+        step_log = self.get_step(step)
+        row, column = step_log["row"], step_log["column"]
+
+        if row == 0:
+            message = f"Минимум на отрезке длинны 1 начиная с индекса {column} - это," \
+                      f"конечно, {self.sparse_table.get_cell_value(row, column)}."
+        elif step_log["left_start"] is None:
+            message = f"Так как отрезок длины {1 << row} начиная с индекса {column} " \
+                      f"выходит за пределы исходного массива,\n то оставляем данную клетку пустой."
+        else:
+            message = f"Покрываем отрезок длины {1 << row} начиная с индекса {column} " \
+                      f"двумя отрезками длины {1 << (row - 1)}. \nПервый начинается с индекса " \
+                      f"{step_log['left_start']} и имеет минимум " \
+                      f"{self.sparse_table.get_cell_value(row - 1, step_log['left_start'])}, второй " \
+                      f"начинается с индекса {step_log['right_start']} и имеет минимум " \
+                      f"{self.sparse_table.get_cell_value(row - 1, step_log['right_start'])}.\n" \
+                      f"Заносим меньший из минимумов в таблицу, т.е. {self.sparse_table.get_cell_value(row, column)}"
+
+        return "ОПИСАНИЕ ШАГА\n" + message
 
 
 class TableCanvas(tk.Canvas):
@@ -305,23 +397,34 @@ class TableCanvas(tk.Canvas):
         #Настройка скролл баров и отображения таблицы
         self.horizontal_scroll = tk.Scrollbar(parent, orient=tk.HORIZONTAL)
         self.horizontal_scroll.pack(side=tk.BOTTOM, fill=tk.X)
-        self.horizontal_scroll.config(command=self.xview)
+        self.horizontal_scroll.config(command=self.process_xview)
 
         self.vertical_scroll = tk.Scrollbar(parent, orient=tk.VERTICAL)
         self.vertical_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.vertical_scroll.config(command=self.yview)
+        self.vertical_scroll.config(command=self.process_yview)
 
         self.config(xscrollcommand=self.horizontal_scroll.set, yscrollcommand=self.vertical_scroll.set)
         self.pack(expand=True, fill=tk.BOTH)
 
         self.bind("<Motion>", self.process_motion)
+        self.bind("<Configure>", lambda event: self.schedule_viewport_redraw())
 
         self.max_width = max_width
         self.max_height = max_height
 
-        self.last_x = 0
-        self.last_y = 0
         self.cell_size = 35
+        self.render_margin = 2
+
+        #Нарисованные клетки: (строка, столбец) -> (прямоугольник, текст); -1 - заголовки
+        self.drawn_cells = {}
+        self.free_items = []
+
+        #Изменения между кадрами копятся здесь и рисуются одним вызовом repaint
+        self.dirty_cells = set()
+        self.highlighted_cells = set()
+        self.viewport_changed = False
+        self.pending_motion = None
+        self.repaint_job = None
 
         self.current_row = None
         self.current_column = None
@@ -329,6 +432,10 @@ class TableCanvas(tk.Canvas):
         self.table_cells = None
         self.sparse_table = None
 
+        #В пошаговом режиме показываются только значения клеток с номером шага не больше current_step
+        self.timeline = None
+        self.current_step = None
+
     def fill_table(self, array):
         self.sparse_table = SparseTable(array)
 
@@ -343,39 +450,123 @@ class TableCanvas(tk.Canvas):
             for g in range(table_cols):
                 self.table_cells[i][g] = TableCell(self.sparse_table.get_cell_value(i, g))
 
-    def redraw_table(self):
         self.delete("all")
+        self.drawn_cells = {}
+        self.free_items = []
+        self.dirty_cells = set()
+        self.highlighted_cells = set()
+        self.timeline = None
+        self.current_step = None
+        self.config(scrollregion=(0, 0, (table_cols + 1) * self.cell_size, (table_rows + 1) * self.cell_size))
 
+    def redraw_table(self):
         if self.sparse_table is not None:
             rows, columns = self.sparse_table.get_shapes()
         else:
             rows = columns = 0
 
-        self.last_x = self.cell_size
-        self.last_y = 0
-
-        for column in range(columns):
-            TableCell(number=column, state="border").draw_on(surface=self, x=self.last_x, y=0, size=self.cell_size)
-            self.last_x += self.cell_size
-
-        self.last_x = 0
-        self.last_y = self.cell_size
-
-        for row in range(rows):
-            TableCell(number=row, state="border").draw_on(surface=self, x=0, y=self.last_y, size=self.cell_size)
-            self.last_y += self.cell_size
-
-        self.last_x = self.cell_size
-        self.last_y = self.cell_size
-
-        for row in range(rows):
-            for column in range(columns):
-                self.table_cells[row][column].draw_on(surface=self, x=self.last_x, y=self.last_y, size=self.cell_size)
-                self.last_x += self.cell_size
-            self.last_x = self.cell_size
-            self.last_y += self.cell_size
+        #Рисуем только клетки видимой области и запас в render_margin клеток вокруг нее,
+        #поэтому стоимость перерисовки зависит от размера окна, а не таблицы
+        width = max(self.winfo_width(), int(self["width"]))
+        height = max(self.winfo_height(), int(self["height"]))
+        first_column = max(0, int(self.canvasx(0) // self.cell_size) - self.render_margin)
+        last_column = min(columns + 1, int(self.canvasx(width) // self.cell_size) + 1 + self.render_margin)
+        first_row = max(0, int(self.canvasy(0) // self.cell_size) - self.render_margin)
+        last_row = min(rows + 1, int(self.canvasy(height) // self.cell_size) + 1 + self.render_margin)
+
+        visible_cells = {}
+        for row in range(first_row - 1, last_row - 1):
+            for column in range(first_column - 1, last_column - 1):
+                if row == -1 and column == -1:
+                    continue
+                if row == -1:
+                    visible_cells[(row, column)] = TableCell(number=column, state="border")
+                elif column == -1:
+                    visible_cells[(row, column)] = TableCell(number=row, state="border")
+                else:
+                    visible_cells[(row, column)] = self.table_cells[row][column]
+
+        for key in list(self.drawn_cells):
+            if key not in visible_cells:
+                items = self.drawn_cells.pop(key)
+                for item in items:
+                    self.itemconfig(item, state="hidden")
+                self.free_items.append(items)
+
+        for (row, column), cell in visible_cells.items():
+            items = self.drawn_cells.get((row, column))
+            if items is None and self.free_items:
+                items = self.free_items.pop()
+            self.drawn_cells[(row, column)] = cell.draw_on(surface=self, x=(column + 1) * self.cell_size,
+                                                           y=(row + 1) * self.cell_size, size=self.cell_size,
+                                                           items=items, show_number=self.is_number_shown(row, column))
+
+        self.dirty_cells.clear()
+        self.viewport_changed = False
+
+    def schedule_repaint(self):
+        if self.repaint_job is None:
+            self.repaint_job = self.after_idle(self.repaint)
+
+    def schedule_viewport_redraw(self):
+        self.viewport_changed = True
+        self.schedule_repaint()
+
+    def repaint(self):
+        self.repaint_job = None
+
+        if self.pending_motion is not None:
+            x, y = self.pending_motion
+            self.pending_motion = None
+            if self.window.can_use_canvases():
+                self.move_cursor(x, y)
+
+        if self.viewport_changed:
+            self.redraw_table()
+            return
 
-        self.config(scrollregion=self.bbox("all"))
+        #Перерисовываем только изменившиеся клетки, попавшие в видимую область
+        for row, column in self.dirty_cells:
+            items = self.drawn_cells.get((row, column))
+            if items is not None:
+                self.table_cells[row][column].draw_on(surface=self, x=(column + 1) * self.cell_size,
+                                                      y=(row + 1) * self.cell_size, size=self.cell_size,
+                                                      items=items, show_number=self.is_number_shown(row, column))
+        self.dirty_cells.clear()
+
+    def set_cell_state(self, row, column, state):
+        self.table_cells[row][column].set_state(state)
+        if self.table_cells[row][column].state == "inactive":
+            self.highlighted_cells.discard((row, column))
+        else:
+            self.highlighted_cells.add((row, column))
+        self.dirty_cells.add((row, column))
+        self.schedule_repaint()
+
+    def is_number_shown(self, row, column):
+        return self.timeline is None or row < 0 or column < 0 or \
+            self.timeline.get_step_number(row, column) <= self.current_step
+
+    def scroll_to_cell(self, row, column):
+        width = max(self.winfo_width(), int(self["width"]))
+        height = max(self.winfo_height(), int(self["height"]))
+        rows, columns = self.sparse_table.get_shapes()
+        x, y = (column + 1) * self.cell_size, (row + 1) * self.cell_size
+
+        if not self.canvasx(0) <= x <= self.canvasx(width) - self.cell_size:
+            self.xview_moveto(max(0, x - width / 2) / ((columns + 1) * self.cell_size))
+            self.schedule_viewport_redraw()
+        if not self.canvasy(0) <= y <= self.canvasy(height) - self.cell_size:
+            self.yview_moveto(max(0, y - height / 2) / ((rows + 1) * self.cell_size))
+            self.schedule_viewport_redraw()
+
+    def process_xview(self, *arguments):
+        self.xview(*arguments)
+        self.schedule_viewport_redraw()
+
+    def process_yview(self, *arguments):
+        self.yview(*arguments)
+        self.schedule_viewport_redraw()
 
     def get_rows_number(self):
         return len(self.table_cells)
@@ -384,126 +575,101 @@ class TableCanvas(tk.Canvas):
         return len(self.table_cells[0])
 
     def process_motion(self, event):
-        if not self.window.can_use_canvases():
+        if not self.window.can_use_canvases() or self.sparse_table is None:
             return
 
-        if self.current_row is not None and self.current_column is not None:
-            self.unhighlight_cell(self.current_row, self.current_column)
+        #Серия событий движения схлопывается до последней позиции курсора
+        self.pending_motion = (event.x, event.y)
+        self.schedule_repaint()
+
+    def move_cursor(self, x, y):
+        row = column = None
 
-        self.current_row = self.current_column = None
+        if self.cell_size < self.canvasx(x) < self.cell_size * (self.sparse_table.get_shapes()[1] + 1) - 1:
+            if self.cell_size < self.canvasy(y) < self.cell_size * (self.sparse_table.get_shapes()[0] + 1) - 1:
+                row = self._get_row_by_y(y)
+                column = self._get_column_by_x(x)
 
-        if self.cell_size < event.x < self.cell_size * (self.sparse_table.get_shapes()[1] + 1) - 1:
-            if self.cell_size < event.y < self.cell_size * (self.sparse_table.get_shapes()[0] + 1) - 1:
-                self.current_row = self._get_row_by_y(event.y)
-                self.current_column = self._get_column_by_x(event.x)
+        if row == self.current_row and column == self.current_column:
+            return
 
-                self.highlight_cell_with_parents(self.current_row, self.current_column)
+        if self.current_row is not None and self.current_column is not None:
+            self.unhighlight_cell(self.current_row, self.current_column)
 
-        self.redraw_table()
+        self.current_row, self.current_column = row, column
+        if row is not None:
+            self.highlight_cell_with_parents(row, column)
 
     def highlight_cell(self, row, column, mode="active"):
-        self.table_cells[row][column].set_state(mode)
-        self.redraw_table()
+        self.set_cell_state(row, column, mode)
 
     def highlight_cell_with_parents(self, row, column):
-        self.table_cells[row][column].set_state("active")
+        self.set_cell_state(row, column, "active")
 
         if row > 0 and self.sparse_table.get_shapes()[1] - (1 << row) >= column:
-            self.table_cells[row - 1][column].set_state("left")
-            self.table_cells[row - 1][column + (1 << (row - 1))].set_state("right")
-
-        self.redraw_table()
+            self.set_cell_state(row - 1, column, "left")
+            self.set_cell_state(row - 1, column + (1 << (row - 1)), "right")
 
     def unhighlight_cell(self, row, column):
-        self.table_cells[row][column].set_state("inactive")
+        self.set_cell_state(row, column, "inactive")
 
         if row > 0 and self.get_columns_number() - (1 << row) >= column:
-            self.table_cells[row - 1][column].set_state("inactive")
-            self.table_cells[row - 1][column + (1 << (row - 1))].set_state("inactive")
-
-        self.redraw_table()
+            self.set_cell_state(row - 1, column, "inactive")
+            self.set_cell_state(row - 1, column + (1 << (row - 1)), "inactive")
 
     def unhighligth_all_cells(self):
-        for row in range(self.get_rows_number()):
-            for column in range(self.get_columns_number()):
-                self.table_cells[row][column].set_state("inactive")
-
-        self.redraw_table()
+        for row, column in list(self.highlighted_cells):
+            self.set_cell_state(row, column, "inactive")
 
     def initialize_step_building(self):
+        self.timeline = BuildTimeline(self.sparse_table)
+        self.current_step = -1
         self.current_row = 0
         self.current_column = -1
-        rows_number, columns_number = self.sparse_table.get_shapes()
-        for row in range(rows_number):
-            for column in range(columns_number):
-                self.table_cells[row][column].number = ""
         self.redraw_table()
 
-    def perform_action(self):
-        self.table_cells[self.current_row][self.current_column].number =\
-            self.sparse_table.get_cell_value(self.current_row, self.current_column)
-
-        left_child_start = None
-        right_child_start = None
+    def go_to_step(self, step):
+        step = max(-1, min(step, len(self.timeline) - 1))
+        if self.current_step >= 0:
+            self.unhighlight_cell(self.current_row, self.current_column)
 
-        if self.current_row == 0:
-            message_to_return = f"Минимум на отрезке длинны 1 начиная с индекса {self.current_column} - это," \
-                                f"конечно, {self.sparse_table.get_cell_value(self.current_row, self.current_column)}."
-        elif self.sparse_table.get_shapes()[1] - (1 << self.current_row) < self.current_column:
-            message_to_return = f"Так как отрезок длины {1 << self.current_row} начиная с индекса {self.current_column} " \
-                                f"выходит за пределы исходного массива,\n то оставляем данную клетку пустой."
+        #Значение меняется только у клеток с шагами между старым и новым номером;
+        #при далеком переходе достаточно проверить уже нарисованные клетки
+        first_step, last_step = sorted((self.current_step, step))
+        if last_step - first_step <= len(self.drawn_cells):
+            for changed_step in range(first_step + 1, last_step + 1):
+                self.dirty_cells.add(divmod(changed_step, self.timeline.columns_number))
         else:
-            left_child_start = self.current_column
-            right_child_start = self.current_column + (1 << (self.current_row - 1))
-
-            message_to_return = f"Покрываем отрезок длины {1 << self.current_row} начиная с индекса {self.current_column} " \
-                                f"двумя отрезками длины {1 << (self.current_row - 1)}. \nПервый начинается с индекса " \
-                                f"{left_child_start} и имеет минимум " \
-                                f"{self.sparse_table.get_cell_value(self.current_row - 1, left_child_start)}, второй " \
-                                f"начинается с индекса {right_child_start} и имеет минимум " \
-                                f"{self.sparse_table.get_cell_value(self.current_row - 1, right_child_start)}.\n" \
-                                f"Заносим меньший из минимумов в таблицу, т.е. {self.sparse_table.get_cell_value(self.current_row, self.current_column)}"
-
+            for row, column in self.drawn_cells:
+                if row >= 0 and column >= 0 and \
+                        first_step < self.timeline.get_step_number(row, column) <= last_step:
+                    self.dirty_cells.add((row, column))
+        self.current_step = step
+        self.schedule_repaint()
+
+        if step < 0:
+            self.current_row, self.current_column = 0, -1
+            return {"left_start": None, "right_start": None, "parent_row": -1, "message": ""}
+
+        step_log = self.timeline.get_step(step)
+        self.current_row, self.current_column = step_log["row"], step_log["column"]
         self.highlight_cell_with_parents(self.current_row, self.current_column)
-        self.redraw_table()
+        self.scroll_to_cell(self.current_row, self.current_column)
 
-        return {"left_start": left_child_start,
-                "right_start" : right_child_start,
-                "parent_row": self.current_row - 1,
-                "message": "ОПИСАНИЕ ШАГА\n" + message_to_return}
+        step_log["message"] = self.timeline.get_message(step)
+        return step_log
 
     def to_next_step(self):
-        rows_number, columns_number = self.sparse_table.get_shapes()
-
-        self.unhighlight_cell(self.current_row, self.current_column)
-
-        self.current_column += 1
-        if self.current_column == columns_number:
-            self.current_row += 1
-            self.current_column = 0
-
-        return self.perform_action()
+        return self.go_to_step(self.current_step + 1)
 
     def to_previous_step(self):
-        rows_number, columns_number = self.sparse_table.get_shapes()
-
-        self.table_cells[self.current_row][self.current_column].number = ""
-        self.unhighlight_cell(self.current_row, self.current_column)
-
-        self.current_column -= 1
-        if self.current_column == -1:
-            self.current_row -= 1
-            self.current_column = columns_number - 1
-
-        return self.perform_action()
+        return self.go_to_step(self.current_step - 1)
 
     def _get_column_by_x(self, x_value):
-        return math.floor(x_value / self.cell_size +
-                          (self.horizontal_scroll.get()[0] * self.sparse_table.get_shapes()[1])) - 1
+        return math.floor(self.canvasx(x_value) / self.cell_size) - 1
 
     def _get_row_by_y(self, y_value):
-        return math.floor(y_value / self.cell_size +
-                          (self.vertical_scroll.get()[0] * self.sparse_table.get_shapes()[0])) - 1
+        return math.floor(self.canvasy(y_value) / self.cell_size) - 1
 
 
 class Application(tk.Tk):
@@ -526,6 +692,7 @@ class Application(tk.Tk):
         self.table_canvas = TableCanvas(self.table_frame, self, bg="white", max_width=735, max_height=175)
 
         self.button_add_tile = tk.Button(self, text="Добавить элемент", bg="#bdffc0")
+        self.button_load_file = tk.Button(self, text="Загрузить из файла", bg="#bdffc0")
         self.button_build_table = tk.Button(self, text="Построить Sparse Table", bg="#b5c1ff")
         self.button_step_build_table = tk.Button(self, text="Построить пошагово", bg="#b5c1ff")
         self.button_next_step = tk.Button(self, text="След. шаг", bg="#a8ffaa")
@@ -534,6 +701,15 @@ class Application(tk.Tk):
         self.button_find_minimum = tk.Button(self, text="Найти минимум", bg="#b5c1ff")
         self.button_show_description = tk.Button(self, text="Описание")
 
+        self.step_entry = tk.Entry(self, width=6, font="Arial 12")
+        self.button_go_to_step = tk.Button(self, text="К шагу")
+        self.level_entry = tk.Entry(self, width=3, font="Arial 12")
+        self.button_go_to_level = tk.Button(self, text="К уровню")
+        self.button_autoplay = tk.Button(self, text="Авто", bg="#a8ffaa")
+        self.autoplay_scale = tk.Scale(self, from_=1, to=500, orient=tk.HORIZONTAL, length=150,
+                                       label="Шагов в секунду")
+        self.autoplay_job = None
+
         self.button_sample1 = tk.Button(self, text="1")
         self.button_sample2 = tk.Button(self, text="2")
         self.button_sample3 = tk.Button(self, text="3")
@@ -559,12 +735,16 @@ class Application(tk.Tk):
     def bind_widgets(self):
         self.button_show_description.bind("<Button-1>", lambda event: self.show_description_window())
         self.button_add_tile.bind("<Button-1>", lambda event: self.add_element_to_array())
+        self.button_load_file.bind("<Button-1>", lambda event: self.load_file())
         self.button_build_table.bind("<Button-1>", lambda event: self.build_table())
         self.button_step_build_table.bind("<Button-1>", lambda event: self.start_step_building())
 
         self.button_next_step.bind("<Button-1>", lambda event: self.next_step())
         self.button_previous_step.bind("<Button-1>", lambda event: self.previous_step())
         self.button_end_steps.bind("<Button-1>", lambda event: self.end_step_building())
+        self.button_go_to_step.bind("<Button-1>", lambda event: self.jump_to_step())
+        self.button_go_to_level.bind("<Button-1>", lambda event: self.jump_to_level())
+        self.button_autoplay.bind("<Button-1>", lambda event: self.toggle_autoplay())
 
         self.button_find_minimum.bind("<Button-1>", lambda event: self.find_minimum())
         self.button_sample1.bind("<Button-1>", lambda event: self.load_sample(int(event.widget["text"])))
@@ -575,6 +755,7 @@ class Application(tk.Tk):
         self.button_show_description.place(x=30, y=10)
         self.array_frame.place(x=30, y=95)
         self.button_add_tile.place(x=220, y=65)
+        self.button_load_file.place(x=370, y=65)
         self.button_build_table.place(x=645, y=65)
         self.array_label.place(x=30, y=60)
 
@@ -587,37 +768,32 @@ class Application(tk.Tk):
         if self.in_step_building or self.in_showing_answer:
             return
 
-        self.array_canvas.delete_all_tiles()
-
         if sample_index == 1:
-            self.add_element_to_array(4)
-            self.add_element_to_array(1)
-            self.add_element_to_array(10)
-            self.add_element_to_array(7)
-            self.add_element_to_array(3)
-            self.add_element_to_array(7)
-            self.add_element_to_array(5)
+            numbers = [4, 1, 10, 7, 3, 7, 5]
         elif sample_index == 2:
-            self.add_element_to_array(100)
-            self.add_element_to_array(-2)
-            self.add_element_to_array(10)
-            self.add_element_to_array(0)
-            self.add_element_to_array(1.45)
-            self.add_element_to_array(-14)
-            self.add_element_to_array(69)
-            self.add_element_to_array(95)
-            self.add_element_to_array(-12)
-            self.add_element_to_array(-0.3)
-            self.add_element_to_array(4)
-            self.add_element_to_array(4.6)
-            self.add_element_to_array(54)
-            self.add_element_to_array(-17)
-            self.add_element_to_array(-81)
-            self.add_element_to_array(310)
-        elif sample_index == 3:
-            array_size = random.randint(5, 30)
-            for _ in range(array_size):
-                self.add_element_to_array(random.randint(-100, 100))
+            numbers = [100, -2, 10, 0, 1.45, -14, 69, 95, -12, -0.3, 4, 4.6, 54, -17, -81, 310]
+        else:
+            numbers = [random.randint(-100, 100) for _ in range(random.randint(5, 30))]
+
+        self.array_canvas.set_numbers(numbers)
+
+    def load_file(self):
+        if not self.can_use_canvases():
+            return
+
+        path = tkinter.filedialog.askopenfilename(parent=self, title="Загрузить массив",
+                                                  filetypes=[("CSV и текст", "*.csv *.txt"), ("NumPy", "*.npy"),
+                                                             ("Все файлы", "*")])
+        if not path:
+            return
+
+        try:
+            numbers = read_numbers_file(path)
+        except (OSError, ValueError):
+            self.show_error_label("Не удалось прочитать числа из файла!")
+            return
+
+        self.array_canvas.set_numbers(numbers)
 
     def show_description_window(self):
         new_window = tk.Toplevel(self)
@@ -717,6 +893,7 @@ class Application(tk.Tk):
         self.button_step_build_table["state"] = "disabled"
         self.button_build_table["state"] = "disabled"
         self.button_add_tile["state"] = "disabled"
+        self.button_load_file["state"] = "disabled"
 
         self.button_previous_step.place(x=self.table_frame.winfo_x() + self.table_frame.winfo_width() / 2 - 75,
                                         y=self.table_frame.winfo_y() + self.table_frame.winfo_height() + 8)
@@ -727,57 +904,126 @@ class Application(tk.Tk):
         self.button_end_steps.place(x=self.table_frame.winfo_x() + self.table_frame.winfo_width() / 2 + 100,
                                     y=self.table_frame.winfo_y() + self.table_frame.winfo_height() + 8)
 
+        controls_y = self.table_frame.winfo_y() + self.table_frame.winfo_height() + 50
+        self.step_entry.place(x=30, y=controls_y + 3)
+        self.button_go_to_step.place(x=100, y=controls_y)
+        self.level_entry.place(x=190, y=controls_y + 3)
+        self.button_go_to_level.place(x=230, y=controls_y)
+        self.button_autoplay.place(x=340, y=controls_y)
+        self.autoplay_scale.place(x=400, y=controls_y - 20)
+
         self.action_label.place(x=5, y=600)
 
         self.table_canvas.initialize_step_building()
 
     def end_step_building(self):
         self.in_step_building = False
+        self.stop_autoplay()
 
         self.table_canvas.current_row = self.table_canvas.current_column = None
         self.build_table()
         self.table_canvas.redraw_table()
 
-        self.array_canvas.highlight_section(0, self.table_canvas.get_columns_number(), "inactive")
-        self.array_canvas.redraw_all_tiles()
+        self.array_canvas.unhighlite_all_tiles()
 
         self.show_finding_block()
 
         self.button_step_build_table["state"] = "normal"
         self.button_build_table["state"] = "normal"
         self.button_add_tile["state"] = "normal"
+        self.button_load_file["state"] = "normal"
 
         self.button_previous_step.place(x=x_away, y=y_away)
         self.button_next_step.place(x=x_away, y=y_away)
         self.button_end_steps.place(x=x_away, y=y_away)
+        self.step_entry.place(x=x_away, y=y_away)
+        self.button_go_to_step.place(x=x_away, y=y_away)
+        self.level_entry.place(x=x_away, y=y_away)
+        self.button_go_to_level.place(x=x_away, y=y_away)
+        self.button_autoplay.place(x=x_away, y=y_away)
+        self.autoplay_scale.place(x=x_away, y=y_away)
         self.action_label.place(x=x_away, y=y_away)
 
         self.action_label["text"] = ""
 
-    def next_step(self):
-        table_rows, table_cols = self.table_canvas.sparse_table.get_shapes()
-        if self.table_canvas.current_row == table_rows - 1 and self.table_canvas.current_column == table_cols - 1:
+    def go_to_step(self, step):
+        if step >= len(self.table_canvas.timeline):
             self.end_step_building()
-        else:
-            step_log = self.table_canvas.to_next_step()
-            self.action_label["text"] = step_log["message"]
-            self.array_canvas.unhighlite_all_tiles()
-            if step_log["left_start"] is not None and step_log["right_start"] is not None and step_log[
-                "parent_row"] >= 0:
-                self.array_canvas.highlight_section(step_log["left_start"], 1 << step_log["parent_row"], "left")
-                self.array_canvas.highlight_section(step_log["right_start"], 1 << step_log["parent_row"], "right")
+            return
+
+        step_log = self.table_canvas.go_to_step(step)
+        self.action_label["text"] = step_log["message"]
+        self.array_canvas.unhighlite_all_tiles()
+        if step_log["left_start"] is not None and step_log["right_start"] is not None and step_log[
+            "parent_row"] >= 0:
+            self.array_canvas.highlight_section(step_log["left_start"], 1 << step_log["parent_row"], "left")
+            self.array_canvas.highlight_section(step_log["right_start"], 1 << step_log["parent_row"], "right")
+
+    def next_step(self):
+        self.go_to_step(self.table_canvas.current_step + 1)
 
     def previous_step(self):
-        if self.table_canvas.current_row == 0 and self.table_canvas.current_column <= 0:
+        if self.table_canvas.current_step <= 0:
+            return
+        self.go_to_step(self.table_canvas.current_step - 1)
+
+    def jump_to_step(self):
+        steps_number = len(self.table_canvas.timeline)
+        try:
+            step = int(self.step_entry.get())
+        except ValueError:
+            self.show_error_label("Номер шага не число!")
+            return
+
+        if not 1 <= step <= steps_number:
+            self.show_error_label(f"Номер шага должен быть от 1 до {steps_number}!")
+            return
+
+        self.go_to_step(step - 1)
+
+    def jump_to_level(self):
+        rows_number = self.table_canvas.timeline.rows_number
+        try:
+            level = int(self.level_entry.get())
+        except ValueError:
+            self.show_error_label("Номер уровня не число!")
+            return
+
+        if not 0 <= level < rows_number:
+            self.show_error_label(f"Номер уровня должен быть от 0 до {rows_number - 1}!")
+            return
+
+        self.go_to_step(self.table_canvas.timeline.get_level_start(level))
+
+    def toggle_autoplay(self):
+        if not self.in_step_building:
             return
+
+        if self.autoplay_job is not None:
+            self.stop_autoplay()
+        else:
+            self.button_autoplay["text"] = "Стоп"
+            self.autoplay_step()
+
+    def autoplay_step(self):
+        #При высокой скорости за один тик делается несколько шагов, чтобы не загружать цикл событий
+        rate = self.autoplay_scale.get()
+        delay = max(1000 // rate, 20)
+        current_step = self.table_canvas.current_step
+        last_step = len(self.table_canvas.timeline) - 1
+
+        self.autoplay_job = None
+        if current_step < last_step:
+            self.go_to_step(min(current_step + max(1, rate * delay // 1000), last_step))
+            self.autoplay_job = self.after(delay, self.autoplay_step)
         else:
-            step_log = self.table_canvas.to_previous_step()
-            self.action_label["text"] = step_log["message"]
-            self.array_canvas.unhighlite_all_tiles()
-            if step_log["left_start"] is not None and step_log["right_start"] is not None and step_log[
-                "parent_row"] >= 0:
-                self.array_canvas.highlight_section(step_log["left_start"], 1 << step_log["parent_row"], "left")
-                self.array_canvas.highlight_section(step_log["right_start"], 1 << step_log["parent_row"], "right")
+            self.end_step_building()
+
+    def stop_autoplay(self):
+        if self.autoplay_job is not None:
+            self.after_cancel(self.autoplay_job)
+            self.autoplay_job = None
+        self.button_autoplay["text"] = "Авто"
 
     def show_finding_block(self):
         self.finding_label.place(x=30, y=470)
@@ -841,4 +1087,5 @@ class Application(tk.Tk):
         self.error_label.place(x=x_away, y=y_away)
 
 
-Application()
+if __name__ == "__main__":
+    Application()
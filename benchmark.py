@@ -0,0 +1,286 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from sparse_table import BlockSparseTable, DisjointSparseTable, SparseTable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+engines = {
+    "numpy": lambda array: SparseTable(array),
+    "numpy-compact": lambda array: SparseTable(array, compact=True),
+    "python": lambda array: SparseTable(array, use_numpy=False),
+    "python-compact": lambda array: SparseTable(array, use_numpy=False, compact=True),
+    "block": lambda array: BlockSparseTable(array),
+    "disjoint": lambda array: DisjointSparseTable(array),
+}
+
+python_engines = {"python", "python-compact"}
+
+# Метрики, по которым сравниваются прогоны: True, если больше - лучше
+compared_metrics = {
+    "build_seconds": False,
+    "peak_memory_bytes": False,
+    "single_query_seconds": False,
+    "batch_queries_per_second": True,
+    "import_seconds": False,
+}
+
+
+def estimate_memory(engine, size):
+    rows_number = int(math.log2(size)) + 1
+    if engine in python_engines:
+        return rows_number * size * 8 + size * 32
+    if engine == "block":
+        return 4 * size * 8
+    return rows_number * size * 8
+
+
+def generate_array(size, distribution, dtype, generator):
+    if np is not None:
+        if distribution == "constant":
+            array = np.full(size, 7)
+        elif dtype == "int":
+            array = generator.integers(-10**9, 10**9, size)
+        else:
+            array = generator.random(size) * 2e9 - 1e9
+        if distribution == "sorted":
+            array.sort()
+        return array.astype(np.int64 if dtype == "int" else np.float64)
+
+    if distribution == "constant":
+        array = [7] * size
+    elif dtype == "int":
+        array = [generator.randint(-10**9, 10**9) for _ in range(size)]
+    else:
+        array = [generator.random() * 2e9 - 1e9 for _ in range(size)]
+    if distribution == "sorted":
+        array.sort()
+    return [float(value) for value in array] if dtype == "float" else array
+
+
+def generate_queries(size, count, generator):
+    if np is not None:
+        return generator.integers(0, size, count), generator.integers(0, size, count)
+    return ([generator.randrange(size) for _ in range(count)],
+            [generator.randrange(size) for _ in range(count)])
+
+
+def measure_build(factory, array, measure_memory):
+    gc.collect()
+    start = time.perf_counter()
+    table = factory(array)
+    build_seconds = time.perf_counter() - start
+
+    peak_memory_bytes = None
+    if measure_memory:
+        # Повторное построение под tracemalloc: сам трассировщик сильно замедляет
+        # чистый Python, поэтому время и память измеряются раздельно
+        del table
+        gc.collect()
+        tracemalloc.start()
+        table = factory(array)
+        peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return table, build_seconds, peak_memory_bytes
+
+
+def measure_single_queries(table, lefts, rights):
+    timings = []
+    for left, right in zip(lefts, rights):
+        start = time.perf_counter()
+        table.get_minimum(left, right)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return sum(timings) / len(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def measure_batch_queries(table, lefts, rights, batch_size):
+    start = time.perf_counter()
+    for batch_start in range(0, len(lefts), batch_size):
+        table.get_minimum_many(lefts[batch_start:batch_start + batch_size], rights[batch_start:batch_start + batch_size])
+    return len(lefts) / (time.perf_counter() - start)
+
+
+def measure_naive_queries(array, lefts, rights):
+    # Базовая линия - min() по срезу из обычных чисел. В список переводится только срез
+    # очередного запроса, и это преобразование не входит в замер
+    total_seconds = 0
+    for left, right in zip(lefts, rights):
+        left, right = min(left, right), max(left, right)
+        values = array[left:right + 1]
+        if np is not None:
+            values = values.tolist()
+        start = time.perf_counter()
+        min(values)
+        total_seconds += time.perf_counter() - start
+    return total_seconds / len(lefts)
+
+
+def measure_import_seconds(repeats):
+    # Холодный импорт ядра в отдельном процессе; запуск самого интерпретатора не учитывается
+    command = [sys.executable, "-c",
+               "import time; start = time.perf_counter(); import sparse_table; print(time.perf_counter() - start)"]
+    timings = [float(subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+                                    capture_output=True, text=True).stdout)
+               for _ in range(repeats)]
+    return min(timings)
+
+
+def run_benchmarks(arguments):
+    if np is not None:
+        generator = np.random.default_rng(arguments.seed)
+    else:
+        generator = random.Random(arguments.seed)
+
+    results = [{"engine": "import", "size": None, "distribution": None, "dtype": None,
+                "import_seconds": measure_import_seconds(arguments.import_repeats)}]
+    for size in arguments.sizes:
+        for distribution in arguments.distributions:
+            for dtype in arguments.dtypes:
+                array = generate_array(size, distribution, dtype, generator)
+                python_array = None
+                lefts, rights = generate_queries(size, arguments.queries, generator)
+                single_lefts = [int(index) for index in lefts[:arguments.single_queries]]
+                single_rights = [int(index) for index in rights[:arguments.single_queries]]
+
+                for engine in arguments.engines:
+                    result = {"engine": engine, "size": size, "distribution": distribution, "dtype": dtype}
+                    results.append(result)
+
+                    if engine in python_engines and size > arguments.python_limit:
+                        result["skipped"] = "размер больше --python-limit"
+                        continue
+                    if estimate_memory(engine, size) > arguments.memory_limit_gb * 2**30:
+                        result["skipped"] = "оценка памяти больше --memory-limit-gb"
+                        continue
+
+                    engine_array = array
+                    if engine in python_engines:
+                        # Список из обычных чисел занимает в разы больше массива numpy,
+                        # поэтому строится только для движков, которые действительно запускаются
+                        if python_array is None:
+                            python_array = array.tolist() if np is not None else array
+                        engine_array = python_array
+                    table, result["build_seconds"], result["peak_memory_bytes"] = measure_build(
+                        engines[engine], engine_array, not arguments.no_memory)
+                    result["single_query_seconds"], result["single_query_p99_seconds"] = \
+                        measure_single_queries(table, single_lefts, single_rights)
+                    result["batch_queries_per_second"] = measure_batch_queries(table, lefts, rights,
+                                                                               arguments.batch_size)
+                    del table
+
+                    print(f"{engine:>15} n={size:<10} {distribution:>8} {dtype:>5} "
+                          f"build={result['build_seconds']:.4f}s", file=sys.stderr)
+
+                if arguments.naive_queries > 0:
+                    count = max(1, min(arguments.naive_queries, arguments.naive_budget // size))
+                    results.append({"engine": "naive", "size": size, "distribution": distribution, "dtype": dtype,
+                                    "single_query_seconds": measure_naive_queries(
+                                        array, single_lefts[:count], single_rights[:count])})
+                python_array = None
+
+    return results
+
+
+def compare_results(results, baseline_results, tolerance):
+    def key(result):
+        return result["engine"], result["size"], result["distribution"], result["dtype"]
+
+    baseline = {key(result): result for result in baseline_results}
+    regressions = []
+    for result in results:
+        old_result = baseline.get(key(result))
+        if old_result is None:
+            continue
+
+        for metric, higher_is_better in compared_metrics.items():
+            new_value, old_value = result.get(metric), old_result.get(metric)
+            if not new_value or not old_value:
+                continue
+            ratio = new_value / old_value if not higher_is_better else old_value / new_value
+            if ratio > 1 + tolerance:
+                regressions.append({"engine": result["engine"], "size": result["size"],
+                                    "distribution": result["distribution"], "dtype": result["dtype"],
+                                    "metric": metric, "old": old_value, "new": new_value})
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры построения, запросов и памяти разреженных таблиц")
+    parser.add_argument("--sizes", type=parse_sizes, default=[10**power for power in range(3, 9)],
+                        help="размеры массивов через запятую, например 1e3,1e6")
+    parser.add_argument("--distributions", type=lambda text: text.split(","), default=["random", "sorted", "constant"])
+    parser.add_argument("--dtypes", type=lambda text: text.split(","), default=["int", "float"])
+    parser.add_argument("--engines", type=lambda text: text.split(","), default=list(engines))
+    parser.add_argument("--queries", type=int, default=100000, help="количество запросов для пакетного режима")
+    parser.add_argument("--single-queries", type=int, default=10000, help="количество одиночных запросов")
+    parser.add_argument("--batch-size", type=int, default=65536)
+    parser.add_argument("--naive-queries", type=int, default=100,
+                        help="количество запросов min(array[l:r+1]) для базовой линии, 0 - без нее")
+    parser.add_argument("--naive-budget", type=int, default=10**8,
+                        help="суммарный объем элементов, просматриваемых базовой линией на один размер")
+    parser.add_argument("--python-limit", type=int, default=10**6, help="максимальный размер для чистого Python")
+    parser.add_argument("--memory-limit-gb", type=float, default=4.0,
+                        help="пропускать комбинации, чья оценка памяти больше")
+    parser.add_argument("--no-memory", action="store_true", help="не измерять пиковую память")
+    parser.add_argument("--import-repeats", type=int, default=5, help="количество замеров времени импорта ядра")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="файл для результатов в JSON или '-' для stdout")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое относительное ухудшение")
+    arguments = parser.parse_args()
+
+    unknown_engines = set(arguments.engines) - set(engines)
+    if unknown_engines:
+        parser.error(f"неизвестные движки: {', '.join(sorted(unknown_engines))}")
+    if np is None:
+        arguments.engines = [engine for engine in arguments.engines if not engine.startswith("numpy")]
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__ if np is not None else None,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "arguments": {name: value for name, value in vars(arguments).items() if name not in ("output", "compare")},
+        },
+        "results": run_benchmarks(arguments),
+    }
+
+    exit_code = 0
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            report["regressions"] = compare_results(report["results"], json.load(file)["results"],
+                                                    arguments.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if arguments.output == "-":
+        print(text)
+    else:
+        with open(arguments.output, "w") as file:
+            file.write(text)
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,191 @@
-import math
-import random
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import sys
+from array import array as typed_array
 
-def build_sparse_table(array):
-    array_length = len(array)
-    log_length = math.ceil(math.log(array_length, 2))
+from sparse_table import SparseTable, array_typecodes, enable_instrumentation, load_numpy, normalize_bounds, stats
 
-    sparse_table = [[math.inf for _ in range(log_length)] for _ in range(array_length)]
 
-    for i in range(array_length):
-        sparse_table[i][0] = array[i]
-
-    for j in range(1, log_length):
-        for i in range(array_length):
-            if i + 2**(j-1) >= array_length:
+def parse_numbers(tokens):
+    try:
+        return list(map(int, tokens))
+    except ValueError:
+        return list(map(float, tokens))
+
+
+def open_binary_input(path):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin.buffer)
+    return open(path, "rb")
+
+
+def read_array(path, file_format, dtype_name):
+    np = load_numpy()
+    if file_format == "npy":
+        if np is None:
+            raise SystemExit("Ошибка! Для чтения .npy требуется numpy")
+        if path == "-":
+            return np.load(io.BytesIO(sys.stdin.buffer.read()))
+        return np.load(path, mmap_mode="r")
+
+    with open_binary_input(path) as file:
+        data = file.read()
+
+    if file_format == "binary":
+        if np is not None:
+            return np.frombuffer(data, dtype=np.dtype(dtype_name).newbyteorder("<"))
+        array = typed_array(array_typecodes[dtype_name])
+        array.frombytes(data)
+        if sys.byteorder != "little":
+            array.byteswap()
+        return array
+
+    return parse_numbers(data.split())
+
+
+def read_query_chunks(path, file_format, dtype_name, chunk_size):
+    # Запросы читаются порциями по chunk_size пар, чтобы не держать в памяти весь журнал
+    if file_format == "npy":
+        queries = read_array(path, "npy", dtype_name).reshape(-1, 2)
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            yield chunk[:, 0], chunk[:, 1]
+        return
+
+    np = load_numpy()
+    with open_binary_input(path) as file:
+        if file_format == "binary":
+            chunk_bytes = 2 * chunk_size * typed_array(array_typecodes[dtype_name]).itemsize
+            while True:
+                data = file.read(chunk_bytes)
+                if not data:
+                    break
+                if np is not None:
+                    chunk = np.frombuffer(data, dtype=np.dtype(dtype_name).newbyteorder("<"))
+                else:
+                    chunk = typed_array(array_typecodes[dtype_name])
+                    chunk.frombytes(data)
+                    if sys.byteorder != "little":
+                        chunk.byteswap()
+                if len(chunk) % 2 != 0:
+                    raise SystemExit("Ошибка! Число границ в файле запросов нечетное")
+                yield chunk[0::2], chunk[1::2]
+            return
+
+        while True:
+            lines = list(itertools.islice(file, chunk_size))
+            if not lines:
                 break
-            sparse_table[i][j] = min(sparse_table[i][j-1], sparse_table[i + 2**(j-1)][j-1])
-
-    return sparse_table
-
-def get_min(sparse_table, l, r):
-    if l == r:
-        return sparse_table[l][0]
+            bounds = list(map(int, b" ".join(lines).split()))
+            if len(bounds) % 2 != 0:
+                raise SystemExit("Ошибка! Запрос должен состоять из левой и правой границы")
+            yield bounds[0::2], bounds[1::2]
 
-    k = math.ceil(math.log(r - l + 1, 2)) - 1
-    return min(sparse_table[l][k], sparse_table[r - 2**k + 1][k])
 
-print("Введите количество элементов массива: ", end="")
-array_length = int(input())
+def run_bulk(arguments):
+    array = read_array(arguments.array, arguments.array_format, arguments.dtype)
+    if len(array) == 0:
+        raise SystemExit("Ошибка! Массив пуст")
 
-print("\nВведите элементы массива: ")
-array = []
+    sparse_table = SparseTable(array, compact=True)
 
-for i in range(array_length):
-    print(f"{i}: ", end="")
-    array.append(int(input()))
+    if arguments.output == "-":
+        output = sys.stdout
+    else:
+        output = open(arguments.output, "w", buffering=1 << 20)
 
-sparse_table = build_sparse_table(array)
-print("\nРазреженная таблица построена! Для того, чтобы завершить программу введите: -1 -1")
-
-first_input = second_input = 0
-while (True):
-    print("\nВведите левую и правую границу запроса на минимум: ", end="")
     try:
-        first_input, second_input = tuple(map(lambda x: int(x), input().split()))
-    except ValueError:
-        print("Ошибка! Были введены некорректные границы интервала!")
-        continue
-
-    if first_input == -1 and second_input == -1:
-        break
+        for lefts, rights in read_query_chunks(arguments.queries, arguments.queries_format, "int64",
+                                               arguments.chunk_size):
+            if len(lefts) == 0:
+                continue
+            try:
+                lefts, rights = normalize_bounds(lefts, rights, len(array))
+            except IndexError:
+                raise SystemExit("Ошибка! Границы интервала выходят за пределы массива!")
+
+            answers = sparse_table.get_minimum_many(lefts, rights)
+            if not isinstance(answers, list):
+                answers = answers.tolist()
+            output.write("\n".join(map(str, answers)))
+            output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        else:
+            output.flush()
+
+
+def run_interactive():
+    print("Введите количество элементов массива: ", end="")
+    array_length = int(input())
+
+    print("\nВведите элементы массива: ")
+    array = []
 
-    if not (0 <= first_input < len(array) and 0 <= second_input < len(array)):
-        print("Ошибка! Границы интервала выходят за пределы массива!")
-        continue
+    for i in range(array_length):
+        print(f"{i}: ", end="")
+        array.append(int(input()))
+
+    sparse_table = SparseTable(array)
+    print("\nРазреженная таблица построена! Для того, чтобы завершить программу введите: -1 -1")
+
+    first_input = second_input = 0
+    while (True):
+        print("\nВведите левую и правую границу запроса на минимум: ", end="")
+        try:
+            first_input, second_input = tuple(map(lambda x: int(x), input().split()))
+        except ValueError:
+            print("Ошибка! Были введены некорректные границы интервала!")
+            continue
+
+        if first_input == -1 and second_input == -1:
+            break
+
+        if not (0 <= first_input < len(array) and 0 <= second_input < len(array)):
+            print("Ошибка! Границы интервала выходят за пределы массива!")
+            continue
+
+        print(f"Результат: минимум на отрезке [{first_input}, {second_input}] "
+              f"это {sparse_table.get_minimum(first_input, second_input)}")
+
+    print("Завершение программы")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск минимума на отрезке с помощью Sparse Table. "
+                                                 "Без аргументов запускается интерактивный режим.")
+    parser.add_argument("--array", help="файл с массивом или '-' для stdin (пакетный режим)")
+    parser.add_argument("--array-format", choices=["text", "npy", "binary"], default="text",
+                        help="формат массива: числа через пробел, .npy или сырые little-endian значения")
+    parser.add_argument("--dtype", choices=sorted(array_typecodes), default="int64",
+                        help="тип значений для формата binary")
+    parser.add_argument("--queries", default="-", help="файл с парами границ или '-' для stdin")
+    parser.add_argument("--queries-format", choices=["text", "npy", "binary"], default="text",
+                        help="формат запросов: пары чисел, .npy формы (m, 2) или сырые int64")
+    parser.add_argument("--chunk-size", type=int, default=1 << 16, help="количество запросов в одной порции")
+    parser.add_argument("--output", default="-", help="файл для ответов или '-' для stdout")
+    parser.add_argument("--stats", action="store_true",
+                        help="собрать статистику построения и запросов и вывести ее в stderr в JSON")
+    arguments = parser.parse_args()
+
+    if arguments.array == "-" and arguments.queries == "-":
+        parser.error("массив и запросы не могут одновременно читаться из stdin")
+
+    if arguments.stats:
+        enable_instrumentation()
+    try:
+        if arguments.array is None:
+            run_interactive()
+        else:
+            run_bulk(arguments)
+    finally:
+        if arguments.stats:
+            print(json.dumps(stats(), indent=2), file=sys.stderr)
 
-    print(f"Результат: минимум на отрезке [{first_input}, {second_input}] "
-          f"это {get_min(sparse_table, first_input, second_input)}")
 
-print("Завершение программы")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from array import array as typed_array
+
+from sparse_table import SparseTable, is_numpy_array, load_numpy
+
+
+class LowestCommonAncestor:
+    # Наименьший общий предок ищется как вершина минимальной глубины в эйлеровом обходе
+    # между первыми вхождениями двух вершин; минимум отвечает SparseTable в режиме индексов.
+    # Деревья леса разделяются в обходе фиктивной вершиной -1 глубины -1, поэтому для
+    # вершин из разных деревьев ответ -1
+    def __init__(self, parents=None, adjacency=None, root=0, use_numpy=True):
+        if (parents is None) == (adjacency is None):
+            raise ValueError("Нужно передать либо массив родителей, либо списки смежности")
+
+        if parents is None:
+            parents = self._get_parents_by_adjacency(adjacency, root)
+        elif is_numpy_array(parents):
+            parents = parents.tolist()
+        else:
+            parents = list(parents)
+
+        self.nodes_number = len(parents)
+        if self.nodes_number == 0:
+            raise ValueError("Дерево должно содержать хотя бы одну вершину")
+
+        np = load_numpy() if use_numpy else None
+        self.use_numpy = np is not None
+        self.tour, tour_depths, self.first, self.depths = self._build_euler_tour(parents)
+        self.table = SparseTable(tour_depths, use_numpy=use_numpy, return_index=True, compact=True)
+
+        if self.use_numpy:
+            self._tour_array = np.array(self.tour, dtype=np.intp)
+            self._first_array = np.array(self.first, dtype=np.intp)
+
+    def lca(self, node1, node2):
+        if not (0 <= node1 < self.nodes_number and 0 <= node2 < self.nodes_number):
+            raise IndexError("Номер вершины выходит за пределы дерева")
+        return self.tour[self.table.get_minimum(self.first[node1], self.first[node2])]
+
+    def lca_many(self, nodes1, nodes2):
+        if not self.use_numpy:
+            return [self.lca(node1, node2) for node1, node2 in zip(nodes1, nodes2)]
+
+        np = load_numpy()
+        nodes1 = np.asarray(nodes1, dtype=np.intp)
+        nodes2 = np.asarray(nodes2, dtype=np.intp)
+        if nodes1.shape != nodes2.shape:
+            raise ValueError("Массивы вершин должны иметь одинаковую длину")
+        if len(nodes1) == 0:
+            return np.empty(0, dtype=np.intp)
+        if min(nodes1.min(), nodes2.min()) < 0 or max(nodes1.max(), nodes2.max()) >= self.nodes_number:
+            raise IndexError("Номер вершины выходит за пределы дерева")
+
+        positions = self.table.get_minimum_many(self._first_array[nodes1], self._first_array[nodes2])
+        return self._tour_array[positions]
+
+    def get_distance(self, node1, node2):
+        ancestor = self.lca(node1, node2)
+        if ancestor == -1:
+            return None
+        return self.depths[node1] + self.depths[node2] - 2 * self.depths[ancestor]
+
+    def _get_parents_by_adjacency(self, adjacency, root):
+        # Обход в ширину без рекурсии; ребро к уже посещенной вершине, кроме родителя, - цикл
+        nodes_number = len(adjacency)
+        if not 0 <= root < nodes_number:
+            raise ValueError("Корень выходит за пределы дерева")
+
+        parents = [-2] * nodes_number
+        parents[root] = -1
+        queue = [root]
+        for node in queue:
+            for neighbour in adjacency[node]:
+                if neighbour == parents[node]:
+                    continue
+                if parents[neighbour] != -2:
+                    raise ValueError("Граф содержит цикл и не является деревом")
+                parents[neighbour] = node
+                queue.append(neighbour)
+
+        if len(queue) != nodes_number:
+            raise ValueError("Граф несвязный: не все вершины достижимы из корня")
+        return parents
+
+    def _get_children(self, parents):
+        # Дети хранятся плоско (CSR): дети вершины v - children[starts[v]:starts[v + 1]]
+        nodes_number = len(parents)
+        counts = [0] * (nodes_number + 1)
+        roots = []
+        for node, parent in enumerate(parents):
+            if parent == -1 or parent == node:
+                roots.append(node)
+            elif 0 <= parent < nodes_number:
+                counts[parent + 1] += 1
+            else:
+                raise ValueError(f"Родитель вершины {node} выходит за пределы дерева")
+
+        for node in range(nodes_number):
+            counts[node + 1] += counts[node]
+        starts = counts
+
+        positions = starts[:-1]
+        children = [0] * (nodes_number - len(roots))
+        for node, parent in enumerate(parents):
+            if parent != -1 and parent != node:
+                children[positions[parent]] = node
+                positions[parent] += 1
+
+        return roots, children, starts
+
+    def _build_euler_tour(self, parents):
+        nodes_number = len(parents)
+        roots, children, starts = self._get_children(parents)
+        if not roots:
+            raise ValueError("В массиве родителей нет корня (вершины с родителем -1)")
+
+        tour = typed_array("q")
+        tour_depths = typed_array("q")
+        first = typed_array("q", [-1]) * nodes_number
+        depths = typed_array("q", [0]) * nodes_number
+        next_child = list(starts[:-1])
+
+        # Обход в глубину на явном стеке: вершина записывается при входе и после
+        # возврата из каждого ребенка, всего 2k - 1 записей на дерево из k вершин
+        for root_index, root in enumerate(roots):
+            if root_index > 0:
+                tour.append(-1)
+                tour_depths.append(-1)
+
+            first[root] = len(tour)
+            tour.append(root)
+            tour_depths.append(0)
+            stack = [root]
+            while stack:
+                node = stack[-1]
+                if next_child[node] < starts[node + 1]:
+                    child = children[next_child[node]]
+                    next_child[node] += 1
+                    depths[child] = depths[node] + 1
+                    first[child] = len(tour)
+                    tour.append(child)
+                    tour_depths.append(depths[child])
+                    stack.append(child)
+                else:
+                    stack.pop()
+                    if stack:
+                        tour.append(stack[-1])
+                        tour_depths.append(depths[stack[-1]])
+
+        if len(tour) != 2 * nodes_number - 1:
+            raise ValueError("Массив родителей содержит цикл")
+        return tour, tour_depths, first, depths
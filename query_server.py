@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import struct
+import sys
+from array import array as typed_array
+
+from sparse_table import (SparseTable, get_little_endian_bytes, infer_dtype_name, is_numpy_array, load_numpy,
+                          normalize_bounds)
+
+# Кадр (little-endian): длина полезной нагрузки и команда в запросе или статус в ответе.
+# Нагрузка запроса начинается с имени таблицы; у query за ним идут пары границ int64
+# (l0, r0, l1, r1, ...), у load - путь к файлу таблицы. Ответ на query - код типа
+# ('q', 'Q' или 'd') и значения
+frame_header = struct.Struct("<IB")
+name_header = struct.Struct("<H")
+
+query_command = 1
+load_command = 2
+drop_command = 3
+
+# Типы значений в ответе: все числа с плавающей точкой передаются как float64, целые - как
+# int64, и только uint64, не помещающиеся в int64, - как uint64
+answer_dtype_names = {
+    "q": "int64",
+    "Q": "uint64",
+    "d": "float64",
+}
+
+ok_status = 0
+error_status = 1
+
+
+def encode_name(name):
+    name = name.encode()
+    return name_header.pack(len(name)) + name
+
+
+def decode_name(payload):
+    (length,) = name_header.unpack_from(payload)
+    end = name_header.size + length
+    return bytes(payload[name_header.size:end]).decode(), memoryview(payload)[end:]
+
+
+def encode_pairs(lefts, rights):
+    if len(lefts) != len(rights):
+        raise ValueError("Массивы левых и правых границ должны иметь одинаковую длину")
+
+    np = load_numpy()
+    if np is not None:
+        pairs = np.empty(2 * len(lefts), dtype="<i8")
+        pairs[0::2] = lefts
+        pairs[1::2] = rights
+        return pairs.tobytes()
+
+    pairs = typed_array("q", itertools.chain.from_iterable(zip(lefts, rights)))
+    if sys.byteorder != "little":
+        pairs.byteswap()
+    return pairs.tobytes()
+
+
+def decode_pairs(data):
+    if len(data) % 16 != 0:
+        raise ValueError("Запрос должен состоять из пар границ int64")
+
+    np = load_numpy()
+    if np is not None:
+        pairs = np.frombuffer(data, dtype="<i8")
+        return pairs[0::2].astype(np.intp), pairs[1::2].astype(np.intp)
+
+    pairs = typed_array("q", bytes(data))
+    if sys.byteorder != "little":
+        pairs.byteswap()
+    return pairs[0::2], pairs[1::2]
+
+
+def encode_answers(answers):
+    if len(answers) == 0:
+        return b"q"
+
+    # Ответы Python-таблицы, построенной из массива numpy, могут быть скалярами numpy
+    np = load_numpy()
+    if np is not None and not is_numpy_array(answers):
+        answers = np.asarray(answers)
+    typecode = get_answers_typecode(answers)
+    return typecode.encode() + bytes(get_little_endian_bytes(answers, answer_dtype_names[typecode]))
+
+
+def get_answers_typecode(answers):
+    dtype_name = infer_dtype_name(answers)
+    if dtype_name is not None and dtype_name.startswith("float"):
+        return "d"
+    if dtype_name is not None and (dtype_name != "uint64" or answers.max() < 2**63):
+        return "q"
+
+    # Целые вне int64 приходят из uint64: в numpy с типом uint64, в Python - списком
+    if dtype_name == "uint64" or (all(type(answer) is int for answer in answers)
+                                  and 0 <= min(answers) and max(answers) < 2**64):
+        return "Q"
+    raise ValueError("Передавать можно только числовые ответы")
+
+
+def decode_answers(data):
+    typecode, data = chr(data[0]), bytes(data[1:])
+    np = load_numpy()
+    if np is not None:
+        return np.frombuffer(data, dtype=np.dtype(answer_dtype_names[typecode]).newbyteorder("<"))
+
+    answers = typed_array(typecode, data)
+    if sys.byteorder != "little":
+        answers.byteswap()
+    return answers
+
+
+class QueryServer:
+    def __init__(self, tables=None, batch_window=0.0005, max_batch=1 << 16):
+        self.tables = dict(tables or {})
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        # Запросы к одной таблице, пришедшие в течение batch_window, копятся и выполняются
+        # одним вызовом get_minimum_many
+        self._pending = {}
+        self._pending_sizes = {}
+        self._flush_handles = {}
+        self._servers = []
+        self._connections = {}
+
+    def add_table(self, name, table):
+        self._flush(name)
+        old_table = self.tables.get(name)
+        self.tables[name] = table
+        if old_table is not None and old_table is not table and hasattr(old_table, "close"):
+            old_table.close()
+
+    def load_table(self, name, path):
+        self.add_table(name, SparseTable.open(path))
+
+    def drop_table(self, name):
+        self._flush(name)
+        table = self._get_table(name)
+        del self.tables[name]
+        if hasattr(table, "close"):
+            table.close()
+
+    async def query(self, name, lefts, rights):
+        table = self._get_table(name)
+        lefts, rights = normalize_bounds(lefts, rights, table.columns_number)
+        if len(lefts) == 0:
+            return []
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(name, []).append((lefts, rights, future))
+        self._pending_sizes[name] = self._pending_sizes.get(name, 0) + len(lefts)
+
+        if self._pending_sizes[name] >= self.max_batch:
+            self._flush(name)
+        elif name not in self._flush_handles:
+            self._flush_handles[name] = loop.call_later(self.batch_window, self._flush, name)
+        return await future
+
+    async def process_frame(self, command, payload):
+        try:
+            name, data = decode_name(payload)
+            if command == query_command:
+                lefts, rights = decode_pairs(data)
+                return ok_status, encode_answers(await self.query(name, lefts, rights))
+            if command == load_command:
+                self.load_table(name, bytes(data).decode())
+                return ok_status, b""
+            if command == drop_command:
+                self.drop_table(name)
+                return ok_status, b""
+            raise ValueError(f"Неизвестная команда {command}")
+        except Exception as error:
+            # Любая ошибка запроса возвращается клиентом: иначе она остановила бы задачу,
+            # отправляющую ответы, и остальные запросы соединения ждали бы вечно
+            return error_status, (str(error) or type(error).__name__).encode()
+
+    async def handle_connection(self, reader, writer):
+        # Запросы одного соединения выполняются конвейером, ответы уходят в порядке запросов
+        responses = asyncio.Queue()
+        writer_task = asyncio.ensure_future(self._write_responses(responses, writer))
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    length, command = frame_header.unpack(await reader.readexactly(frame_header.size))
+                    payload = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                await responses.put(asyncio.ensure_future(self.process_frame(command, payload)))
+        finally:
+            await responses.put(None)
+            await writer_task
+            writer.close()
+            self._connections.pop(writer, None)
+
+    async def start_unix(self, path):
+        server = await asyncio.start_unix_server(self.handle_connection, path)
+        self._servers.append(server)
+        return server
+
+    async def start_tcp(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for name in list(self._pending):
+            self._flush(name)
+
+        connection_tasks = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*connection_tasks, return_exceptions=True)
+
+    def _get_table(self, name):
+        if name not in self.tables:
+            raise ValueError(f"Таблица '{name}' не найдена")
+        return self.tables[name]
+
+    def _flush(self, name):
+        handle = self._flush_handles.pop(name, None)
+        if handle is not None:
+            handle.cancel()
+        pending = self._pending.pop(name, [])
+        self._pending_sizes.pop(name, None)
+        if not pending:
+            return
+
+        try:
+            table = self._get_table(name)
+            np = load_numpy()
+            if np is not None:
+                lefts = np.concatenate([request[0] for request in pending])
+                rights = np.concatenate([request[1] for request in pending])
+            else:
+                lefts = list(itertools.chain.from_iterable(request[0] for request in pending))
+                rights = list(itertools.chain.from_iterable(request[1] for request in pending))
+            answers = table.get_minimum_many(lefts, rights)
+        except Exception as error:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        offset = 0
+        for request_lefts, _, future in pending:
+            if not future.done():
+                future.set_result(answers[offset:offset + len(request_lefts)])
+            offset += len(request_lefts)
+
+    async def _write_responses(self, responses, writer):
+        while True:
+            task = await responses.get()
+            if task is None:
+                return
+            status, data = await task
+            try:
+                writer.write(frame_header.pack(len(data), status) + data)
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+class QueryClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._waiters = collections.deque()
+        self._reader_task = asyncio.ensure_future(self._read_responses())
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    @classmethod
+    async def connect_tcp(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def query(self, name, lefts, rights):
+        return decode_answers(await self._request(query_command, encode_name(name) + encode_pairs(lefts, rights)))
+
+    async def load(self, name, path):
+        await self._request(load_command, encode_name(name) + path.encode())
+
+    async def drop(self, name):
+        await self._request(drop_command, encode_name(name))
+
+    async def close(self):
+        self.writer.close()
+        await self._reader_task
+
+    async def _request(self, command, payload):
+        # Запросы не ждут ответов на предыдущие: ответы приходят по порядку и
+        # сопоставляются с ожидающими их запросами
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.writer.write(frame_header.pack(len(payload), command) + payload)
+        await self.writer.drain()
+        return self._check_response(*await future)
+
+    def _check_response(self, status, data):
+        if status != ok_status:
+            raise ValueError(bytes(data).decode())
+        return data
+
+    async def _read_responses(self):
+        try:
+            while True:
+                length, status = frame_header.unpack(await self.reader.readexactly(frame_header.size))
+                data = await self.reader.readexactly(length)
+                self._waiters.popleft().set_result((status, data))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            while self._waiters:
+                self._waiters.popleft().set_exception(ConnectionError(f"Соединение закрыто: {error}"))
+
+
+class LocalClient(QueryClient):
+    # Тот же протокол, но кадры передаются серверу напрямую, без сокета
+    def __init__(self, server):
+        self.server = server
+
+    async def close(self):
+        pass
+
+    async def _request(self, command, payload):
+        return self._check_response(*await self.server.process_frame(command, payload))
+
+
+def parse_table_argument(text):
+    name, separator, path = text.partition("=")
+    if not separator or not name or not path:
+        raise argparse.ArgumentTypeError("таблица задается как ИМЯ=ПУТЬ")
+    return name, path
+
+
+async def serve(arguments):
+    server = QueryServer(batch_window=arguments.batch_window / 1000, max_batch=arguments.max_batch)
+    for name, path in arguments.table:
+        server.load_table(name, path)
+
+    if arguments.unix is not None:
+        listener = await server.start_unix(arguments.unix)
+    else:
+        listener = await server.start_tcp(arguments.host, arguments.port)
+
+    print(f"Сервер запущен, таблицы: {', '.join(server.tables) or 'нет'}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер запросов к разреженным таблицам")
+    parser.add_argument("--unix", help="путь к Unix-сокету; без него используется TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7437)
+    parser.add_argument("--table", type=parse_table_argument, action="append", default=[],
+                        help="таблица, сохраненная SparseTable.save, в виде ИМЯ=ПУТЬ; можно указать несколько раз")
+    parser.add_argument("--batch-window", type=float, default=0.5,
+                        help="сколько миллисекунд копить запросы перед пакетным выполнением")
+    parser.add_argument("--max-batch", type=int, default=1 << 16,
+                        help="количество запросов, при котором пакет выполняется сразу")
+    arguments = parser.parse_args()
+
+    try:
+        asyncio.run(serve(arguments))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
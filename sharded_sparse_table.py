@@ -0,0 +1,222 @@
+import collections
+import json
+import os
+import sys
+from array import array as typed_array
+
+from sparse_table import (SparseTable, array_typecodes, get_numpy_operation, get_python_operation,
+                          infer_dtype_name, is_numpy_array, load_numpy, normalize_bounds,
+                          promote_dtype_names)
+
+manifest_name = "manifest.json"
+top_table_name = "top.sptb"
+
+
+def get_shard_name(shard):
+    return f"shard_{shard:06d}.sptb"
+
+
+def read_file_chunks(path, file_format="binary", dtype_name="int64", chunk_size=1 << 20):
+    # Файл читается порциями, и в памяти одновременно находится только одна порция
+    if file_format == "npy":
+        np = load_numpy()
+        if np is None:
+            raise ValueError("Для чтения .npy требуется numpy")
+        values = np.load(path, mmap_mode="r")
+        for start in range(0, len(values), chunk_size):
+            yield np.array(values[start:start + chunk_size])
+        return
+
+    np = load_numpy()
+    itemsize = typed_array(array_typecodes[dtype_name]).itemsize
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(chunk_size * itemsize)
+            if not data:
+                break
+            if np is not None:
+                yield np.frombuffer(data, dtype=np.dtype(dtype_name).newbyteorder("<"))
+            else:
+                chunk = typed_array(array_typecodes[dtype_name], data)
+                if sys.byteorder != "little":
+                    chunk.byteswap()
+                yield chunk
+
+
+def split_into_shards(chunks, shard_size):
+    pieces = []
+    pieces_size = 0
+    for chunk in chunks:
+        start = 0
+        while start < len(chunk):
+            taken = min(shard_size - pieces_size, len(chunk) - start)
+            pieces.append(chunk[start:start + taken])
+            pieces_size += taken
+            start += taken
+            if pieces_size == shard_size:
+                yield join_pieces(pieces)
+                pieces = []
+                pieces_size = 0
+
+    if pieces:
+        yield join_pieces(pieces)
+
+
+def join_pieces(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    if is_numpy_array(pieces[0]):
+        return load_numpy().concatenate(pieces)
+
+    shard = pieces[0][:0]
+    for piece in pieces:
+        shard.extend(piece)
+    return shard
+
+
+class ShardedSparseTable:
+    # Массив делится на шарды по shard_size элементов, для каждого строится своя таблица
+    # в отдельном файле, а поверх минимумов шардов - небольшая верхняя таблица. Запрос
+    # складывается из хвоста первого шарда, начала последнего и верхней таблицы для шардов
+    # между ними. Шарды отображаются в память по требованию, и суммарный размер открытых
+    # файлов не превышает memory_budget: давно не использованные шарды закрываются
+    def __init__(self, directory, memory_budget=256 << 20, use_numpy=True):
+        with open(os.path.join(directory, manifest_name)) as file:
+            manifest = json.load(file)
+
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.use_numpy = use_numpy and load_numpy() is not None
+        self.columns_number = manifest["columns_number"]
+        self.shard_size = manifest["shard_size"]
+        self.shards_number = manifest["shards_number"]
+        self.operation = manifest["operation"]
+        self.dtype = manifest["dtype"]
+
+        self._python_operation = get_python_operation(self.operation)
+        self._numpy_operation = get_numpy_operation(self.operation) if self.use_numpy else None
+        self.top_table = SparseTable.open(os.path.join(directory, top_table_name), use_numpy=self.use_numpy)
+
+        self._open_shards = collections.OrderedDict()
+        self._open_bytes = 0
+
+    @classmethod
+    def build(cls, chunks, directory, shard_size=1 << 20, operation="min", memory_budget=256 << 20,
+              use_numpy=True):
+        if shard_size < 1:
+            raise ValueError("Размер шарда должен быть положительным")
+        if not isinstance(operation, str):
+            raise ValueError("Шардированная таблица поддерживает только именованные операции")
+
+        os.makedirs(directory, exist_ok=True)
+        columns_number = 0
+        shard_minima = []
+        dtype_name = None
+        for shard, values in enumerate(split_into_shards(chunks, shard_size)):
+            table = SparseTable(values, use_numpy=use_numpy, operation=operation, compact=True)
+            table.save(os.path.join(directory, get_shard_name(shard)))
+            shard_minima.append(table.get_minimum(0, len(values) - 1))
+
+            shard_dtype_name = infer_dtype_name(values)
+            dtype_name = shard_dtype_name if shard == 0 else promote_dtype_names(dtype_name, shard_dtype_name)
+            if dtype_name is None:
+                raise ValueError("Все шарды должны содержать числа одного типа")
+            columns_number += len(values)
+            del table
+
+        if columns_number == 0:
+            raise ValueError("Массив пуст")
+
+        SparseTable(shard_minima, use_numpy=use_numpy, operation=operation, compact=True).save(
+            os.path.join(directory, top_table_name))
+        with open(os.path.join(directory, manifest_name), "w") as file:
+            json.dump({"columns_number": columns_number, "shard_size": shard_size, "shards_number": len(shard_minima),
+                       "operation": operation, "dtype": dtype_name}, file)
+
+        return cls(directory, memory_budget, use_numpy)
+
+    def get_shapes(self):
+        return self.shards_number, self.columns_number
+
+    def get_minimum(self, index1, index2):
+        if index1 > index2:
+            index1, index2 = index2, index1
+        if index1 < 0 or index2 >= self.columns_number:
+            raise IndexError("Границы интервала выходят за пределы массива")
+
+        first_shard, last_shard = index1 // self.shard_size, index2 // self.shard_size
+        first_offset, last_offset = first_shard * self.shard_size, last_shard * self.shard_size
+        if first_shard == last_shard:
+            return self._get_shard(first_shard).get_minimum(index1 - first_offset, index2 - first_offset)
+
+        answer = self._python_operation(
+            self._get_shard(first_shard).get_minimum(index1 - first_offset, self.shard_size - 1),
+            self._get_shard(last_shard).get_minimum(0, index2 - last_offset))
+        if last_shard - first_shard > 1:
+            answer = self._python_operation(answer, self.top_table.get_minimum(first_shard + 1, last_shard - 1))
+        return answer
+
+    def get_minimum_many(self, indexes1, indexes2):
+        lefts, rights = normalize_bounds(indexes1, indexes2, self.columns_number, self.use_numpy)
+        if not self.use_numpy:
+            return [self.get_minimum(left, right) for left, right in zip(lefts, rights)]
+
+        np = load_numpy()
+        if len(lefts) == 0:
+            return np.empty(0, dtype=self.dtype)
+
+        first_shards = lefts // self.shard_size
+        last_shards = rights // self.shard_size
+        answers = self._query_shards(first_shards, lefts, np.minimum(rights, (first_shards + 1) * self.shard_size - 1))
+
+        crossing = np.flatnonzero(first_shards != last_shards)
+        if len(crossing) > 0:
+            answers[crossing] = self._numpy_operation(
+                answers[crossing],
+                self._query_shards(last_shards[crossing], last_shards[crossing] * self.shard_size, rights[crossing]))
+
+            spanning = crossing[last_shards[crossing] - first_shards[crossing] > 1]
+            if len(spanning) > 0:
+                answers[spanning] = self._numpy_operation(
+                    answers[spanning],
+                    self.top_table.get_minimum_many(first_shards[spanning] + 1, last_shards[spanning] - 1))
+
+        return answers
+
+    def close(self):
+        for table in self._open_shards.values():
+            table.close()
+        self._open_shards.clear()
+        self._open_bytes = 0
+        self.top_table.close()
+
+    def _query_shards(self, shards, lefts, rights):
+        # Запросы группируются по шардам, чтобы каждый шард открывался один раз на пакет
+        np = load_numpy()
+        answers = np.empty(len(shards), dtype=self.dtype)
+        order = np.argsort(shards, kind="stable")
+        sorted_shards = shards[order]
+        bounds = np.flatnonzero(np.diff(sorted_shards)) + 1
+        for positions in np.split(order, bounds):
+            shard = int(shards[positions[0]])
+            offset = shard * self.shard_size
+            answers[positions] = self._get_shard(shard).get_minimum_many(lefts[positions] - offset,
+                                                                         rights[positions] - offset)
+        return answers
+
+    def _get_shard(self, shard):
+        table = self._open_shards.get(shard)
+        if table is not None:
+            self._open_shards.move_to_end(shard)
+            return table
+
+        path = os.path.join(self.directory, get_shard_name(shard))
+        table = SparseTable.open(path, use_numpy=self.use_numpy)
+        self._open_shards[shard] = table
+        self._open_bytes += os.path.getsize(path)
+
+        while self._open_bytes > self.memory_budget and len(self._open_shards) > 1:
+            old_shard, old_table = self._open_shards.popitem(last=False)
+            self._open_bytes -= os.path.getsize(os.path.join(self.directory, get_shard_name(old_shard)))
+            old_table.close()
+        return table
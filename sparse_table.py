@@ -0,0 +1,1511 @@
+import collections
+import functools
+import math
+import mmap
+import operator
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+from array import array as typed_array
+
+# numpy и другие тяжелые модули импортируются лениво: модуль ядра не зависит от GUI
+# и импортируется быстро, а numpy подгружается при первом построении таблицы
+np = None
+numpy_loaded = False
+
+
+def load_numpy():
+    global np, numpy_loaded
+    if not numpy_loaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+        numpy_loaded = True
+    return np
+
+
+def is_numpy_array(value):
+    # Если numpy не импортирован ни нами, ни вызывающим кодом, массивом numpy значение быть не может
+    return "numpy" in sys.modules and isinstance(value, load_numpy().ndarray)
+
+
+# Операции, для которых корректен запрос через два перекрывающихся отрезка:
+# ассоциативные и идемпотентные (op(x, x) == x)
+python_operations = {
+    "min": min,
+    "max": max,
+    "gcd": math.gcd,
+    "and": operator.and_,
+    "or": operator.or_,
+}
+
+numpy_operation_names = {
+    "min": "minimum",
+    "max": "maximum",
+    "gcd": "gcd",
+    "and": "bitwise_and",
+    "or": "bitwise_or",
+}
+
+# Для режима индексов: правый кандидат выбирается только если он строго лучше,
+# поэтому при равенстве остается самый левый индекс
+index_comparators = {
+    "min": operator.lt,
+    "max": operator.gt,
+}
+
+numpy_index_comparator_names = {
+    "min": "less",
+    "max": "greater",
+}
+
+
+# Для DisjointSparseTable достаточно ассоциативности, поэтому допустимы также сумма,
+# произведение и xor (и любые ассоциативные функции, в том числе некоммутативные)
+associative_python_operations = dict(python_operations, sum=operator.add, prod=operator.mul, xor=operator.xor)
+
+associative_numpy_operation_names = dict(numpy_operation_names, sum="add", prod="multiply", xor="bitwise_xor")
+
+
+def get_python_operation(operation, operations=python_operations):
+    if callable(operation):
+        return operation
+    if operation in operations:
+        return operations[operation]
+    raise ValueError(f"Неизвестная операция: {operation!r}")
+
+
+def get_numpy_operation(operation, operation_names=numpy_operation_names):
+    if load_numpy() is None:
+        return None
+    if isinstance(operation, np.ufunc):
+        return operation
+    if operation in operation_names:
+        return getattr(np, operation_names[operation])
+    return None
+
+
+# Типизированное хранение уровней: тип выводится из входного массива,
+# для смешанных входов (например, int и float вместе) остаются обычные списки
+array_typecodes = {
+    "int8": "b",
+    "uint8": "B",
+    "int16": "h",
+    "uint16": "H",
+    "int32": "i",
+    "uint32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "float32": "f",
+    "float64": "d",
+}
+
+
+def infer_dtype_name(array):
+    # Типы numpy без аналога в модуле array расширяются: float16 -> float32,
+    # а long double и прочие экзотические типы хранятся как обычные списки
+    if is_numpy_array(array):
+        if array.ndim != 1 or array.dtype.kind not in "iuf":
+            return None
+        if array.dtype.name in array_typecodes:
+            return array.dtype.name
+        if array.dtype.kind == "f" and array.dtype.itemsize < 4:
+            return "float32"
+        return None
+
+    if len(array) == 0:
+        return None
+
+    value_types = set(map(type, array))
+    if value_types == {int}:
+        minimum, maximum = min(array), max(array)
+        if -2**31 <= minimum and maximum < 2**31:
+            return "int32"
+        if -2**63 <= minimum and maximum < 2**63:
+            return "int64"
+        return None
+    if value_types == {float}:
+        return "float64"
+    return None
+
+
+def get_itemsize(dtype_name):
+    # Файлы таблиц хранят только типы, которые читаются и без numpy
+    if dtype_name not in array_typecodes:
+        raise ValueError(f"Неподдерживаемый тип значений таблицы: {dtype_name}")
+    return typed_array(array_typecodes[dtype_name]).itemsize
+
+
+# Формат файла таблицы (little-endian): заголовок, таблица логарифмов (uint8),
+# затем уровни только с допустимыми ячейками и, в режиме индексов, исходные значения.
+# Каждая секция выровнена, чтобы уровни можно было отображать в память без копирования
+table_file_magic = b"SPTB"
+table_file_version = 1
+table_file_header = struct.Struct("<4sHQB8s8s8s?")
+table_file_alignment = 64
+
+
+def get_table_file_offsets(columns_number, rows_number, itemsize, values_itemsize):
+    def align(offset):
+        return (offset + table_file_alignment - 1) // table_file_alignment * table_file_alignment
+
+    logs_offset = align(table_file_header.size)
+    offset = align(logs_offset + columns_number + 1)
+
+    level_offsets = []
+    for row in range(rows_number):
+        level_offsets.append(offset)
+        offset = align(offset + (columns_number - (1 << row) + 1) * itemsize)
+
+    values_offset = offset
+    end_offset = values_offset + columns_number * values_itemsize
+    return logs_offset, level_offsets, values_offset, end_offset
+
+
+def get_buffer_view(buffer, offset, count, dtype_name, use_numpy):
+    if use_numpy:
+        return np.frombuffer(buffer, dtype=np.dtype(dtype_name).newbyteorder("<"), count=count, offset=offset)
+
+    view = memoryview(buffer)[offset:offset + count * get_itemsize(dtype_name)]
+    if sys.byteorder == "little":
+        return view.cast(array_typecodes[dtype_name])
+
+    values = typed_array(array_typecodes[dtype_name], view.tobytes())
+    values.byteswap()
+    return values
+
+
+def get_little_endian_bytes(values, dtype_name):
+    if is_numpy_array(values):
+        return memoryview(np.ascontiguousarray(values, dtype=np.dtype(dtype_name).newbyteorder("<"))).cast("B")
+
+    values = typed_array(array_typecodes[dtype_name], values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return memoryview(values).cast("B")
+
+
+shared_memory_lock = threading.Lock()
+
+
+# Временем жизни блоков разделяемой памяти управляет SparseTable, а не resource_tracker:
+# иначе процесс, лишь подключившийся к блоку, удалил бы его при своем завершении
+def untrack_shared_memory(shared_memory_block):
+    from multiprocessing import resource_tracker
+
+    if os.name == "posix":
+        resource_tracker.unregister(shared_memory_block._name, "shared_memory")
+
+
+def attach_shared_memory(name):
+    # Регистрация и снятие с учета из нескольких процессов, разделяющих один resource_tracker,
+    # могут перемешаться, поэтому подключение вообще не регистрируется
+    from multiprocessing import resource_tracker, shared_memory
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    with shared_memory_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def release_shared_memory(shared_memory_block, unlink):
+    from multiprocessing import resource_tracker
+
+    shared_memory_block.close()
+    if unlink:
+        if os.name == "posix":
+            # unlink() снимает блок с учета, поэтому перед ним блок регистрируется снова
+            resource_tracker.register(shared_memory_block._name, "shared_memory")
+        shared_memory_block.unlink()
+
+
+# Минимальная длина части уровня, которую имеет смысл отдавать отдельному потоку
+parallel_chunk_size = 1 << 16
+
+
+def normalize_bounds(indexes1, indexes2, columns_number=None, use_numpy=True):
+    # Границы пакета запросов упорядочиваются (left <= right) и проверяются: длины массивов
+    # должны совпадать, а при известной длине массива границы - не выходить за его пределы
+    if use_numpy and load_numpy() is not None:
+        indexes1 = np.asarray(indexes1, dtype=np.intp)
+        indexes2 = np.asarray(indexes2, dtype=np.intp)
+        if indexes1.shape != indexes2.shape:
+            raise ValueError("Массивы левых и правых границ должны иметь одинаковую длину")
+        lefts = np.minimum(indexes1, indexes2)
+        rights = np.maximum(indexes1, indexes2)
+        lowest, highest = (lefts.min(), rights.max()) if len(lefts) > 0 else (0, -1)
+    else:
+        if len(indexes1) != len(indexes2):
+            raise ValueError("Массивы левых и правых границ должны иметь одинаковую длину")
+        lefts = list(map(min, indexes1, indexes2))
+        rights = list(map(max, indexes1, indexes2))
+        lowest, highest = (min(lefts), max(rights)) if lefts else (0, -1)
+
+    if columns_number is not None and (lowest < 0 or highest >= columns_number):
+        raise IndexError("Границы интервала выходят за пределы массива")
+    return lefts, rights
+
+
+def merge_sorted_ranges(starts, ends):
+    # Отрезки отсортированы по началу; соседние и пересекающиеся отрезки склеиваются
+    if len(starts) == 0:
+        return starts, ends
+
+    reached = np.maximum.accumulate(ends)
+    new_range = np.empty(len(starts), dtype=bool)
+    new_range[0] = True
+    new_range[1:] = starts[1:] > reached[:-1] + 1
+
+    first_positions = np.flatnonzero(new_range)
+    last_positions = np.append(first_positions[1:] - 1, len(starts) - 1)
+    return starts[first_positions], reached[last_positions]
+
+
+def promote_dtype_names(first, second):
+    if first == second:
+        return first
+    if first is None or second is None:
+        return None
+
+    if np is not None:
+        first_kind, second_kind = np.dtype(first).kind, np.dtype(second).kind
+        if first_kind == second_kind or {first_kind, second_kind} == {"i", "u"}:
+            promoted = np.promote_types(first, second)
+            if promoted.kind in (first_kind, second_kind):
+                return promoted.name
+        return None
+
+    if {first, second} == {"int32", "int64"}:
+        return "int64"
+    return None
+
+
+def stream_window_minima(values, window_size, operation="min"):
+    # Потоковый минимум окна без таблицы: в деке монотонной очереди лежат индексы
+    # кандидатов, каждое значение добавляется и удаляется не более одного раза
+    if window_size < 1:
+        raise ValueError("Длина окна должна быть положительной")
+    if operation not in index_comparators:
+        raise ValueError("Потоковый режим поддерживается только для операций 'min' и 'max'")
+
+    comparator = index_comparators[operation]
+    candidates = collections.deque()
+    for index, value in enumerate(values):
+        while candidates and not comparator(candidates[-1][1], value):
+            candidates.pop()
+        candidates.append((index, value))
+        if candidates[0][0] <= index - window_size:
+            candidates.popleft()
+        if index >= window_size - 1:
+            yield candidates[0][1]
+
+
+# Сбор статистики выключен по умолчанию: в горячих путях остается только проверка
+# флага instrumentation_enabled. Задержки запросов копятся в гистограммах по степеням
+# двойки: ключ - верхняя граница корзины в наносекундах
+instrumentation_enabled = False
+instrumentation_callback = None
+instrumentation_lock = threading.Lock()
+statistics = None
+
+
+def create_statistics():
+    return {
+        "builds": 0,
+        "build_seconds": 0.0,
+        "levels": {},
+        "single_queries": 0,
+        "single_query_latency_ns": {},
+        "batch_calls": 0,
+        "batched_queries": 0,
+        "batch_latency_ns": {},
+        "logs_cache_hits": 0,
+        "logs_cache_misses": 0,
+        "mapped_tables": 0,
+        "mapped_bytes": 0,
+        "attached_tables": 0,
+        "attached_bytes": 0,
+    }
+
+
+def enable_instrumentation(callback=None):
+    global instrumentation_enabled, instrumentation_callback, statistics
+    with instrumentation_lock:
+        if statistics is None:
+            statistics = create_statistics()
+        instrumentation_callback = callback
+        instrumentation_enabled = True
+
+
+def disable_instrumentation():
+    global instrumentation_enabled, instrumentation_callback
+    instrumentation_enabled = False
+    instrumentation_callback = None
+
+
+def reset_stats():
+    global statistics
+    with instrumentation_lock:
+        statistics = create_statistics()
+
+
+def stats():
+    with instrumentation_lock:
+        snapshot = dict(statistics or create_statistics())
+        snapshot["levels"] = {row: dict(level) for row, level in snapshot["levels"].items()}
+        for name in ("single_query_latency_ns", "batch_latency_ns"):
+            snapshot[name] = dict(snapshot[name])
+    return snapshot
+
+
+def record_event(event, **values):
+    with instrumentation_lock:
+        if statistics is None:
+            return
+
+        if event == "level_built":
+            level = statistics["levels"].setdefault(values["row"], {"builds": 0, "seconds": 0.0, "bytes": 0})
+            level["builds"] += 1
+            level["seconds"] += values["seconds"]
+            level["bytes"] += values["bytes"]
+        elif event == "table_built":
+            statistics["builds"] += 1
+            statistics["build_seconds"] += values["seconds"]
+        elif event == "query":
+            bucket = 1 << values["latency_ns"].bit_length()
+            if values["kind"] == "single":
+                statistics["single_queries"] += 1
+                histogram = statistics["single_query_latency_ns"]
+            else:
+                statistics["batch_calls"] += 1
+                statistics["batched_queries"] += values["count"]
+                histogram = statistics["batch_latency_ns"]
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        elif event == "logs_cache":
+            statistics["logs_cache_hits" if values["hit"] else "logs_cache_misses"] += 1
+        elif event == "table_mapped":
+            statistics["mapped_tables"] += 1
+            statistics["mapped_bytes"] += values["bytes"]
+        elif event == "table_attached":
+            statistics["attached_tables"] += 1
+            statistics["attached_bytes"] += values["bytes"]
+
+    callback = instrumentation_callback
+    if callback is not None:
+        callback(event, values)
+
+
+def get_level_bytes(level):
+    if is_numpy_array(level):
+        return level.nbytes
+    if isinstance(level, typed_array):
+        return len(level) * level.itemsize
+    return sys.getsizeof(level)
+
+
+class SparseTable:
+    def __init__(self, array, use_numpy=True, operation="min", return_index=False, compact=False, workers=None,
+                 lazy=False, max_range=None):
+        build_start = time.perf_counter() if instrumentation_enabled else 0
+        if max_range is not None and max_range < 1:
+            raise ValueError("max_range должен быть положительным")
+
+        # Уровни выше log2(max_range) не строятся никогда. В ленивом режиме сразу строится
+        # только нулевой уровень, остальные - при первом обращении к ним, начиная от
+        # самого высокого построенного; used_levels хранит уровни, нужные запросам
+        self.max_range = max_range
+        self.lazy = lazy
+        self.used_levels = set() if lazy else None
+        self.columns_number = len(array)
+        self.rows_number = self._get_rows_number(self.columns_number)
+        self.built_rows = 1 if lazy else self.rows_number
+        self._capacity = self.columns_number
+        self.logs = self._calculate_logs(self._capacity)
+        self._logs_array = None
+        self._buffer = None
+        self._shared_memory = None
+        self._shared_memory_finalizer = None
+
+        self.operation = operation
+        self.return_index = return_index
+        self._python_operation = get_python_operation(operation)
+        if return_index and operation not in index_comparators:
+            raise ValueError("Режим индексов поддерживается только для операций 'min' и 'max'")
+
+        # Векторизованное построение возможно только для однородных числовых массивов,
+        # иначе значения в ячейках отличались бы от исходных (например, 100 -> 100.0)
+        self.layout = "compact" if compact or lazy else "full"
+        values_dtype_name = infer_dtype_name(array)
+        numpy_operation = get_numpy_operation(operation) if use_numpy else None
+        if numpy_operation is not None and values_dtype_name is not None:
+            self.backend = "numpy"
+            self._numpy_operation = numpy_operation
+            self.values = np.array(array, dtype=values_dtype_name) if return_index else None
+            self.dtype = np.dtype(np.intp if return_index else values_dtype_name)
+            self.table = self._build_numpy_table(array, workers)
+        else:
+            self.backend = "python"
+            self._numpy_operation = None
+            self.values = list(array) if return_index else None
+            if self.layout == "full":
+                self.dtype = None
+                self.table = self._build_sparse_table(array)
+            else:
+                self.dtype = "int64" if return_index else values_dtype_name
+                self.table = self._build_compact_table(array)
+
+        if instrumentation_enabled:
+            record_event("table_built", seconds=time.perf_counter() - build_start, columns_number=self.columns_number,
+                         rows_number=self.rows_number, backend=self.backend, layout=self.layout)
+
+    def get_shapes(self):
+        return self.rows_number, self.columns_number
+
+    def get_cell_value(self, row, column):
+        if column + (1 << row) > self.columns_number:
+            return None
+        if row >= self.built_rows:
+            self._materialize(row)
+
+        if self.backend == "numpy":
+            if self.layout == "full":
+                return self.table.item(row, column)
+            return self.table[row].item(column)
+        return self.table[row][column]
+
+    def get_log_by_length(self, section_length):
+        return int(self.logs[section_length])
+
+    def get_minimum(self, index1, index2):
+        query_start = time.perf_counter_ns() if instrumentation_enabled else 0
+        answer = self._query(index1, index2)
+
+        if instrumentation_enabled:
+            record_event("query", kind="single", count=1, latency_ns=time.perf_counter_ns() - query_start)
+        return answer
+
+    def append(self, value):
+        self.extend([value])
+
+    def extend(self, values):
+        # На каждом уровне добавляются только ячейки, чьи отрезки заканчиваются
+        # на новых элементах: O(log n) ячеек на элемент
+        if self._buffer is not None:
+            raise ValueError("Таблица, открытая из файла или разделяемой памяти, доступна только для чтения")
+
+        if not is_numpy_array(values):
+            values = list(values)
+        if len(values) == 0:
+            return
+
+        old_columns_number = self.columns_number
+        new_columns_number = old_columns_number + len(values)
+        new_rows_number = self._get_rows_number(new_columns_number)
+        # Непостроенные уровни ленивой таблицы позже построятся сразу по новым данным
+        built_rows = self.built_rows if self.lazy else new_rows_number
+
+        self._promote_storage(values)
+        self._reserve(new_columns_number)
+        if self.backend == "python" and not isinstance(values, list):
+            values = values.tolist()
+
+        if self.return_index:
+            if self.backend == "numpy":
+                self.values[old_columns_number:new_columns_number] = values
+            else:
+                self.values.extend(values)
+            first_level_values = range(old_columns_number, new_columns_number)
+        else:
+            first_level_values = values
+
+        if self.backend == "numpy":
+            self.table[0][old_columns_number:new_columns_number] = first_level_values
+            for row in range(1, built_rows):
+                half = 1 << (row - 1)
+                start = max(0, old_columns_number - (1 << row) + 1)
+                end = new_columns_number - (1 << row) + 1
+                previous = self.table[row - 1]
+                self._combine_numpy_cells(previous[start:end], previous[start + half:end + half],
+                                          out=self.table[row][start:end])
+        elif self.layout == "compact":
+            self.table[0].extend(first_level_values)
+            for row in range(1, built_rows):
+                if row == len(self.table):
+                    self.table.append(self.table[0][:0])
+                half = 1 << (row - 1)
+                start = max(0, old_columns_number - (1 << row) + 1)
+                end = new_columns_number - (1 << row) + 1
+                previous = self.table[row - 1]
+                self.table[row].extend(map(self._combine_cells, previous[start:end], previous[start + half:end + half]))
+        else:
+            for level in self.table:
+                level.extend([None] * len(values))
+            while len(self.table) < new_rows_number:
+                self.table.append([None] * new_columns_number)
+
+            self.table[0][old_columns_number:new_columns_number] = first_level_values
+            for row in range(1, new_rows_number):
+                half = 1 << (row - 1)
+                for column in range(max(0, old_columns_number - (1 << row) + 1), new_columns_number - (1 << row) + 1):
+                    self.table[row][column] = self._combine_cells(self.table[row - 1][column],
+                                                                  self.table[row - 1][column + half])
+
+        self.columns_number = new_columns_number
+        self.rows_number = new_rows_number
+        self.built_rows = built_rows
+
+    def update(self, index, value):
+        self.update_many([index], [value])
+
+    # Одно изменение затрагивает на уровне k не более 2^k ячеек, то есть от n до 2n ячеек
+    # суммарно, тогда как перестроение стоит около n*log2(n). Поэтому примерно после
+    # log2(n)/2 отдельных вызовов update выгоднее перестроить таблицу или передать все
+    # изменения в один update_many: он объединяет пересекающиеся грязные отрезки и на
+    # каждом уровне пересчитывает не больше ячеек, чем полное построение
+    def update_many(self, indexes, values):
+        if self._buffer is not None:
+            raise ValueError("Таблица, открытая из файла или разделяемой памяти, доступна только для чтения")
+
+        if not is_numpy_array(values):
+            values = list(values)
+        indexes = list(indexes) if self.backend != "numpy" else np.asarray(indexes, dtype=np.intp)
+        if len(indexes) != len(values):
+            raise ValueError("Количество индексов и значений должно совпадать")
+        if len(indexes) == 0:
+            return
+        if min(indexes) < 0 or max(indexes) >= self.columns_number:
+            raise IndexError("Индекс обновляемого элемента выходит за пределы массива")
+
+        self._promote_storage(values)
+        if self.backend == "numpy":
+            self._update_numpy_cells(np.asarray(indexes, dtype=np.intp), values)
+        else:
+            if not isinstance(values, list):
+                values = values.tolist()
+            self._update_python_cells([int(index) for index in indexes], values)
+
+    def _update_numpy_cells(self, indexes, values):
+        if self.return_index:
+            self.values[indexes] = values
+        else:
+            self.table[0][indexes] = values
+
+        # Грязные ячейки уровня хранятся как отсортированные непересекающиеся отрезки [starts, ends]
+        starts = np.unique(indexes)
+        ends = starts.copy()
+        for row in range(1, self.built_rows):
+            half = 1 << (row - 1)
+            width = self.columns_number - (1 << row) + 1
+            starts = np.maximum(starts - half, 0)
+            ends = np.minimum(ends, width - 1)
+            valid = starts <= ends
+            starts, ends = merge_sorted_ranges(starts[valid], ends[valid])
+            if len(starts) == 0:
+                break
+
+            previous = self.table[row - 1]
+            level = self.table[row]
+            lengths = ends - starts + 1
+            span_start, span_end = int(starts[0]), int(ends[-1]) + 1
+
+            # Плотно покрытый уровень дешевле пересчитать одним непрерывным срезом,
+            # чем собирать разрозненные ячейки по индексам
+            if 4 * lengths.sum() >= span_end - span_start:
+                self._combine_numpy_cells(previous[span_start:span_end], previous[span_start + half:span_end + half],
+                                          out=level[span_start:span_end])
+            else:
+                columns = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+                level[columns] = self._combine_numpy_cells(previous[columns], previous[columns + half])
+
+    def _update_python_cells(self, indexes, values):
+        for index, value in zip(indexes, values):
+            if self.return_index:
+                self.values[index] = value
+            else:
+                self.table[0][index] = value
+
+        ranges = [[index, index] for index in sorted(set(indexes))]
+        for row in range(1, self.built_rows):
+            half = 1 << (row - 1)
+            width = self.columns_number - (1 << row) + 1
+
+            merged_ranges = []
+            for start, end in ranges:
+                start, end = max(start - half, 0), min(end, width - 1)
+                if start > end:
+                    continue
+                if merged_ranges and start <= merged_ranges[-1][1] + 1:
+                    merged_ranges[-1][1] = max(merged_ranges[-1][1], end)
+                else:
+                    merged_ranges.append([start, end])
+            ranges = merged_ranges
+
+            previous = self.table[row - 1]
+            level = self.table[row]
+            for start, end in ranges:
+                for column in range(start, end + 1):
+                    level[column] = self._combine_cells(previous[column], previous[column + half])
+
+    def _promote_storage(self, values):
+        # Тип хранения расширяется под новые значения: int32 -> int64, а при смешивании
+        # разных типов таблица переходит на обычные списки, как при построении
+        if self.backend == "numpy":
+            current_dtype_name = (self.values if self.return_index else self.table[0]).dtype.name
+        elif self.layout == "compact" and not self.return_index:
+            current_dtype_name = self.dtype
+        else:
+            return
+
+        new_dtype_name = promote_dtype_names(current_dtype_name, infer_dtype_name(values))
+        if new_dtype_name == current_dtype_name:
+            return
+
+        if self.return_index:
+            if new_dtype_name is None:
+                self._convert_to_python_storage()
+            else:
+                self.values = self.values.astype(new_dtype_name)
+            return
+
+        if self.backend == "numpy":
+            if new_dtype_name is None:
+                self._convert_to_python_storage()
+            elif self.layout == "compact":
+                self.table = [level.astype(new_dtype_name) for level in self.table]
+                self.dtype = np.dtype(new_dtype_name)
+            else:
+                self.table = self.table.astype(new_dtype_name)
+                self.dtype = np.dtype(new_dtype_name)
+        elif new_dtype_name is None:
+            self.table = [list(level) for level in self.table]
+            self.dtype = None
+        else:
+            self.table = [typed_array(array_typecodes[new_dtype_name], level) for level in self.table]
+            self.dtype = new_dtype_name
+
+    def _convert_to_python_storage(self):
+        widths = [self.columns_number - (1 << row) + 1 for row in range(self.built_rows)]
+        if self.layout == "compact":
+            self.table = [self.table[row][:width].tolist() for row, width in enumerate(widths)]
+            self.dtype = "int64" if self.return_index else None
+            if self.return_index:
+                self.table = [typed_array("q", level) for level in self.table]
+        else:
+            self.table = [self.table[row][:width].tolist() + [None] * (self.columns_number - width)
+                          for row, width in enumerate(widths)]
+            self.dtype = None
+
+        if self.return_index:
+            self.values = self.values[:self.columns_number].tolist()
+
+        self.backend = "python"
+        self._numpy_operation = None
+        self._capacity = self.columns_number
+
+    def _reserve(self, columns_number):
+        # Емкость растет геометрически, чтобы добавление не перевыделяло память каждый раз
+        if columns_number <= self._capacity:
+            return
+
+        capacity = max(columns_number, 2 * self._capacity)
+        self.logs = self._calculate_logs(capacity, self.logs)
+        self._logs_array = None
+
+        if self.backend == "numpy":
+            rows_capacity = self.built_rows if self.lazy else self._get_rows_number(capacity)
+            widths = [self.columns_number - (1 << row) + 1 for row in range(self.built_rows)]
+
+            if self.layout == "compact":
+                table = [np.empty(capacity - (1 << row) + 1, dtype=self.dtype) for row in range(rows_capacity)]
+                for row, width in enumerate(widths):
+                    table[row][:width] = self.table[row][:width]
+            else:
+                table = np.empty((rows_capacity, capacity), dtype=self.dtype)
+                table[:self.rows_number, :self.columns_number] = self.table[:self.rows_number, :self.columns_number]
+            self.table = table
+
+            if self.return_index:
+                values = np.empty(capacity, dtype=self.values.dtype)
+                values[:self.columns_number] = self.values[:self.columns_number]
+                self.values = values
+
+        self._capacity = capacity
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            for offset, data in self._get_file_sections():
+                file.seek(offset)
+                file.write(data)
+            file.truncate()
+
+    @classmethod
+    def open(cls, path, use_numpy=True):
+        # Файл отображается в память только для чтения: страницы подгружаются по мере
+        # обращения и разделяются между процессами через страничный кэш ОС
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        table = cls._from_buffer(buffer, use_numpy)
+
+        if instrumentation_enabled:
+            record_event("table_mapped", bytes=len(buffer))
+        return table
+
+    def share(self):
+        # Таблица публикуется в разделяемую память в том же формате, что и файл;
+        # блок удаляется при close() или при завершении процесса-владельца
+        if self._shared_memory is not None:
+            return self._shared_memory.name
+
+        from multiprocessing import shared_memory
+
+        sections = list(self._get_file_sections())
+        shared_memory_block = shared_memory.SharedMemory(create=True, size=max(sections[-1][0], 1))
+        untrack_shared_memory(shared_memory_block)
+        for offset, data in sections:
+            shared_memory_block.buf[offset:offset + len(data)] = data
+
+        self._shared_memory = shared_memory_block
+        self._shared_memory_finalizer = weakref.finalize(self, release_shared_memory, shared_memory_block, True)
+        return shared_memory_block.name
+
+    @classmethod
+    def attach(cls, name, use_numpy=True):
+        shared_memory_block = attach_shared_memory(name)
+
+        table = cls._from_buffer(shared_memory_block.buf.toreadonly(), use_numpy)
+        table._shared_memory = shared_memory_block
+
+        if instrumentation_enabled:
+            record_event("table_attached", bytes=shared_memory_block.size)
+        return table
+
+    def close(self):
+        # Представления уровней ссылаются на буфер, поэтому освобождаются до его закрытия
+        if self._buffer is None and self._shared_memory is None:
+            return
+
+        if self._buffer is not None:
+            self.table = self.logs = self.values = None
+            self._logs_array = None
+            if isinstance(self._buffer, mmap.mmap):
+                self._buffer.close()
+            else:
+                self._buffer.release()
+            self._buffer = None
+
+        if self._shared_memory_finalizer is not None:
+            self._shared_memory_finalizer()
+        elif self._shared_memory is not None:
+            release_shared_memory(self._shared_memory, False)
+        self._shared_memory = None
+        self._shared_memory_finalizer = None
+
+    def _get_file_sections(self):
+        if not isinstance(self.operation, str):
+            raise ValueError("Сохранить можно только таблицу с именованной операцией")
+        if self.built_rows < self.rows_number:
+            self._materialize(self.rows_number - 1)
+
+        if self.backend == "numpy":
+            dtype_name = self.dtype.name
+        elif self.dtype is not None:
+            dtype_name = self.dtype
+        else:
+            dtype_name = infer_dtype_name(self.table[0])
+
+        values_dtype_name = ""
+        if self.return_index:
+            values_dtype_name = self.values.dtype.name if self.backend == "numpy" else infer_dtype_name(self.values)
+
+        if dtype_name is None or values_dtype_name is None:
+            raise ValueError("Сохранить можно только таблицу с однородными числовыми значениями")
+        if dtype_name not in array_typecodes or (self.return_index and values_dtype_name not in array_typecodes):
+            raise ValueError(f"Сохранить можно только таблицу с типами {', '.join(array_typecodes)}")
+
+        values_itemsize = get_itemsize(values_dtype_name) if self.return_index else 0
+        logs_offset, level_offsets, values_offset, end_offset = get_table_file_offsets(
+            self.columns_number, self.rows_number, get_itemsize(dtype_name), values_itemsize)
+
+        yield 0, table_file_header.pack(table_file_magic, table_file_version, self.columns_number, self.rows_number,
+                                        dtype_name.encode(), values_dtype_name.encode(), self.operation.encode(),
+                                        self.return_index)
+        yield logs_offset, get_little_endian_bytes(self.logs[:self.columns_number + 1], "uint8")
+
+        for row, level_offset in enumerate(level_offsets):
+            width = self.columns_number - (1 << row) + 1
+            yield level_offset, get_little_endian_bytes(self.table[row][:width], dtype_name)
+
+        if self.return_index:
+            yield values_offset, get_little_endian_bytes(self.values, values_dtype_name)
+        yield end_offset, b""
+
+    @classmethod
+    def _from_buffer(cls, buffer, use_numpy=True):
+        magic, version, columns_number, rows_number, dtype_name, values_dtype_name, operation, return_index = \
+            table_file_header.unpack_from(buffer, 0)
+        if magic != table_file_magic:
+            raise ValueError("Данные не являются сохраненной разреженной таблицей")
+        if version != table_file_version:
+            raise ValueError(f"Неподдерживаемая версия формата таблицы: {version}")
+
+        dtype_name = dtype_name.rstrip(b"\0").decode()
+        values_dtype_name = values_dtype_name.rstrip(b"\0").decode()
+        operation = operation.rstrip(b"\0").decode()
+
+        values_itemsize = get_itemsize(values_dtype_name) if return_index else 0
+        logs_offset, level_offsets, values_offset, end_offset = get_table_file_offsets(
+            columns_number, rows_number, get_itemsize(dtype_name), values_itemsize)
+        if len(buffer) < end_offset:
+            raise ValueError("Данные таблицы повреждены или обрезаны")
+
+        table = cls.__new__(cls)
+        table.max_range = None
+        table.lazy = False
+        table.used_levels = None
+        table.columns_number = columns_number
+        table.rows_number = rows_number
+        table.built_rows = rows_number
+        table._capacity = columns_number
+        table._logs_array = None
+        table.operation = operation
+        table.return_index = return_index
+        table._python_operation = get_python_operation(operation)
+        table.layout = "compact"
+
+        numpy_operation = get_numpy_operation(operation) if use_numpy else None
+        if numpy_operation is not None:
+            table.backend = "numpy"
+            table._numpy_operation = numpy_operation
+            table.dtype = np.dtype(dtype_name)
+        else:
+            table.backend = "python"
+            table._numpy_operation = None
+            table.dtype = dtype_name
+
+        in_numpy = table.backend == "numpy"
+        table.logs = get_buffer_view(buffer, logs_offset, columns_number + 1, "uint8", in_numpy)
+        table.table = [get_buffer_view(buffer, level_offset, columns_number - (1 << row) + 1, dtype_name, in_numpy)
+                       for row, level_offset in enumerate(level_offsets)]
+        table.values = None
+        if return_index:
+            table.values = get_buffer_view(buffer, values_offset, columns_number, values_dtype_name, in_numpy)
+
+        table._buffer = buffer
+        table._shared_memory = None
+        table._shared_memory_finalizer = None
+        return table
+
+    def get_minimum_many(self, indexes1, indexes2):
+        query_start = time.perf_counter_ns() if instrumentation_enabled else 0
+
+        lefts, rights = normalize_bounds(indexes1, indexes2, self.columns_number, self.backend == "numpy")
+        if self.backend != "numpy":
+            answers = [self._query(left, right) for left, right in zip(lefts, rights)]
+        else:
+            levels = self._get_logs_array()[rights - lefts + 1]
+            if len(levels) > 0 and (self.used_levels is not None or levels.max() >= self.built_rows):
+                highest_level = int(levels.max())
+                if highest_level >= self.built_rows:
+                    self._materialize(highest_level)
+                if self.used_levels is not None:
+                    self.used_levels.update(np.unique(levels).tolist())
+            answers = self._combine_numpy_cells(self._gather_cells(levels, lefts),
+                                                self._gather_cells(levels, rights - (1 << levels) + 1))
+
+        if instrumentation_enabled:
+            record_event("query", kind="batch", count=len(answers), latency_ns=time.perf_counter_ns() - query_start)
+        return answers
+
+    def window_minima(self, window_size):
+        # При window_size = 2^j + r минимум каждого окна - это операция над двумя сдвинутыми
+        # срезами уровня j, поэтому все окна считаются одним проходом по уровню
+        if not 1 <= window_size <= self.columns_number:
+            raise ValueError("Длина окна должна быть от 1 до длины массива")
+
+        level = int(self.logs[window_size])
+        if level >= self.built_rows:
+            self._materialize(level)
+        if self.used_levels is not None:
+            self.used_levels.add(level)
+
+        windows_number = self.columns_number - window_size + 1
+        shift = window_size - (1 << level)
+        first = self.table[level][:windows_number]
+        second = self.table[level][shift:shift + windows_number]
+
+        if self.backend == "numpy":
+            return self._combine_numpy_cells(first, second)
+        return list(map(self._combine_cells, first, second))
+
+    def window_minima_many(self, window_sizes):
+        return [self.window_minima(window_size) for window_size in window_sizes]
+
+    def _gather_cells(self, levels, columns):
+        if self.layout == "full":
+            return self.table[levels, columns]
+
+        # Уровни хранятся отдельными массивами разной длины, поэтому выборка делается
+        # по одному векторизованному обращению на каждый встретившийся уровень
+        cells = np.empty(columns.shape, dtype=self.dtype)
+        for level in np.unique(levels):
+            mask = levels == level
+            cells[mask] = self.table[level][columns[mask]]
+        return cells
+
+    def _combine_cells(self, first, second):
+        if self.return_index:
+            if index_comparators[self.operation](self.values[second], self.values[first]):
+                return second
+            return first
+
+        return self._python_operation(first, second)
+
+    def _combine_numpy_cells(self, first, second, out=None):
+        if self.return_index:
+            comparator = getattr(np, numpy_index_comparator_names[self.operation])
+            take_second = comparator(self.values[second], self.values[first])
+            if out is None:
+                return np.where(take_second, second, first)
+            out[...] = np.where(take_second, second, first)
+            return out
+
+        return self._numpy_operation(first, second, out=out)
+
+    def _query(self, index1, index2):
+        # Общая часть get_minimum и get_minimum_many; статистику запросов пишут они сами,
+        # чтобы пакет не учитывался как одиночные запросы
+        if index1 > index2:
+            index1, index2 = index2, index1
+
+        # Таблица логарифмов может быть отображена из файла как uint8, поэтому уровень
+        # приводится к int до вычисления индексов
+        level = int(self.logs[index2 - index1 + 1])
+        if level >= self.built_rows:
+            self._materialize(level)
+        if self.used_levels is not None:
+            self.used_levels.add(level)
+        # Значения numpy читаются через item(): это в несколько раз быстрее, чем
+        # индексирование с созданием скаляра numpy и последующим item()
+        second_index = index2 - (1 << level) + 1
+        if self.backend != "numpy":
+            cells = self.table[level]
+            first, second = cells[index1], cells[second_index]
+        elif self.layout == "full":
+            first, second = self.table.item(level, index1), self.table.item(level, second_index)
+        else:
+            cells = self.table[level]
+            first, second = cells.item(index1), cells.item(second_index)
+        if self.return_index:
+            return self._combine_cells(first, second)
+        return self._python_operation(first, second)
+
+    def _get_rows_number(self, columns_number):
+        rows_number = int(math.log2(columns_number)) + 1
+        if self.max_range is not None:
+            rows_number = min(rows_number, int(math.log2(self.max_range)) + 1)
+        return rows_number
+
+    def _materialize(self, row):
+        if row >= self.rows_number:
+            raise ValueError("Длина отрезка больше max_range, для нее уровень таблицы не строится")
+
+        # Новые уровни ленивой таблицы всегда хранятся отдельными массивами
+        while self.built_rows <= row:
+            level_start = time.perf_counter() if instrumentation_enabled else 0
+            new_row = self.built_rows
+            half = 1 << (new_row - 1)
+            width = self.columns_number - (1 << new_row) + 1
+            previous = self.table[new_row - 1]
+
+            if self.backend == "numpy":
+                level = np.empty(self._capacity - (1 << new_row) + 1, dtype=self.dtype)
+                self._fill_numpy_level(previous, level[:width], new_row)
+            elif self.dtype is not None:
+                level = typed_array(array_typecodes[self.dtype],
+                                    map(self._combine_cells, previous[:width], previous[half:half + width]))
+            else:
+                level = list(map(self._combine_cells, previous[:width], previous[half:half + width]))
+
+            self.table.append(level)
+            self.built_rows += 1
+            if instrumentation_enabled:
+                self._record_level(new_row, level_start, level)
+
+    def _get_logs_array(self):
+        if instrumentation_enabled:
+            record_event("logs_cache", hit=self._logs_array is not None)
+        if self._logs_array is None:
+            self._logs_array = np.array(self.logs, dtype=np.intp)
+        return self._logs_array
+
+    def _calculate_logs(self, capacity, logs=None):
+        if logs is None:
+            logs = [0, 0]
+        for i in range(len(logs), capacity + 1):
+            logs.append(logs[i // 2] + 1)
+        return logs
+
+    def _build_numpy_table(self, array, workers=None):
+        level_start = time.perf_counter() if instrumentation_enabled else 0
+        if self.return_index:
+            first_level = np.arange(self.columns_number, dtype=self.dtype)
+        else:
+            first_level = np.array(array, dtype=self.dtype)
+        if instrumentation_enabled:
+            self._record_level(0, level_start, first_level)
+
+        # Ячейки одного уровня независимы, а ядра numpy отпускают GIL, поэтому уровень
+        # можно делить на части между потоками. Уровни строятся строго по очереди
+        executor = None
+        if workers is not None and workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            if self.layout == "compact":
+                table = [first_level]
+                for row in range(1, self.built_rows):
+                    level_start = time.perf_counter() if instrumentation_enabled else 0
+                    width = self.columns_number - (1 << row) + 1
+                    level = np.empty(width, dtype=self.dtype)
+                    self._fill_numpy_level(table[row - 1], level, row, executor, workers)
+                    table.append(level)
+                    if instrumentation_enabled:
+                        self._record_level(row, level_start, level)
+                return table
+
+            # Ячейки за пределами массива не заполняются, get_cell_value возвращает для них None
+            table = np.empty((self.rows_number, self.columns_number), dtype=self.dtype)
+            table[0] = first_level
+
+            for row in range(1, self.built_rows):
+                level_start = time.perf_counter() if instrumentation_enabled else 0
+                width = self.columns_number - (1 << row) + 1
+                self._fill_numpy_level(table[row - 1], table[row, :width], row, executor, workers)
+                if instrumentation_enabled:
+                    self._record_level(row, level_start, table[row, :width])
+
+            return table
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _fill_numpy_level(self, previous, level, row, executor=None, workers=1):
+        half = 1 << (row - 1)
+        width = len(level)
+
+        if executor is None or width < 2 * parallel_chunk_size:
+            self._combine_numpy_cells(previous[:width], previous[half:half + width], out=level)
+            return
+
+        chunks_number = min(workers, width // parallel_chunk_size)
+        bounds = [width * chunk // chunks_number for chunk in range(chunks_number + 1)]
+        futures = [executor.submit(self._combine_numpy_cells, previous[start:end], previous[start + half:end + half],
+                                   level[start:end])
+                   for start, end in zip(bounds, bounds[1:])]
+        for future in futures:
+            future.result()
+
+    def _build_compact_table(self, array):
+        if self.dtype is not None:
+            make_level = lambda values: typed_array(array_typecodes[self.dtype], values)
+        else:
+            make_level = list
+
+        level_start = time.perf_counter() if instrumentation_enabled else 0
+        table = [make_level(range(self.columns_number) if self.return_index else array)]
+        if instrumentation_enabled:
+            self._record_level(0, level_start, table[0])
+
+        for row in range(1, self.built_rows):
+            level_start = time.perf_counter() if instrumentation_enabled else 0
+            half = 1 << (row - 1)
+            width = self.columns_number - (1 << row) + 1
+            previous = table[row - 1]
+            table.append(make_level(map(self._combine_cells, previous[:width], previous[half:half + width])))
+            if instrumentation_enabled:
+                self._record_level(row, level_start, table[row])
+
+        return table
+
+    def _build_sparse_table(self, array):
+        level_start = time.perf_counter() if instrumentation_enabled else 0
+        table = [[None for g in range(self.columns_number)] for i in range(self.rows_number)]
+
+        for i in range(self.columns_number):
+            table[0][i] = i if self.return_index else array[i]
+        if instrumentation_enabled:
+            self._record_level(0, level_start, table[0])
+
+        for row in range(1, self.rows_number):
+            level_start = time.perf_counter() if instrumentation_enabled else 0
+            for column in range(self.columns_number):
+                if column + (1 << row) > self.columns_number:
+                    break
+
+                table[row][column] = self._combine_cells(table[row - 1][column],
+                                                         table[row - 1][column + (1 << (row - 1))])
+            if instrumentation_enabled:
+                self._record_level(row, level_start, table[row])
+
+        return table
+
+    def _record_level(self, row, level_start, level):
+        record_event("level_built", row=row, seconds=time.perf_counter() - level_start, bytes=get_level_bytes(level))
+
+
+class BlockSparseTable:
+    def __init__(self, array, block_size=32, use_numpy=True, operation="min"):
+        if block_size < 1:
+            raise ValueError("Размер блока должен быть положительным")
+
+        self.columns_number = len(array)
+        self.block_size = block_size
+        self.blocks_number = (self.columns_number + block_size - 1) // block_size
+
+        self.operation = operation
+        self._python_operation = get_python_operation(operation)
+
+        # Память O(n): значения, префиксы и суффиксы внутри блоков,
+        # плюс разреженная таблица только по агрегатам блоков
+        dtype_name = infer_dtype_name(array)
+        numpy_operation = get_numpy_operation(operation) if use_numpy else None
+        if numpy_operation is not None and dtype_name is not None:
+            self.backend = "numpy"
+            self._numpy_operation = numpy_operation
+            self.values = np.array(array, dtype=dtype_name)
+            self.prefix, self.suffix = self._build_numpy_blocks()
+        else:
+            self.backend = "python"
+            self._numpy_operation = None
+            self.values = typed_array(array_typecodes[dtype_name], array) if dtype_name is not None else list(array)
+            self.prefix, self.suffix = self._build_python_blocks()
+
+        self.block_table = SparseTable(self.suffix[::block_size], use_numpy=use_numpy, operation=operation,
+                                       compact=True)
+
+    def get_minimum(self, index1, index2):
+        if index1 > index2:
+            index1, index2 = index2, index1
+
+        first_block = index1 // self.block_size
+        last_block = index2 // self.block_size
+
+        if first_block == last_block:
+            return self._scan(index1, index2)
+
+        first, second = self.suffix[index1], self.prefix[index2]
+        if self.backend == "numpy":
+            first, second = first.item(), second.item()
+
+        result = self._python_operation(first, second)
+        if first_block + 1 < last_block:
+            result = self._python_operation(result, self.block_table.get_minimum(first_block + 1, last_block - 1))
+        return result
+
+    def get_minimum_many(self, indexes1, indexes2):
+        lefts, rights = normalize_bounds(indexes1, indexes2, self.columns_number, self.backend == "numpy")
+        if self.backend != "numpy":
+            return [self.get_minimum(left, right) for left, right in zip(lefts, rights)]
+
+        first_blocks = lefts // self.block_size
+        last_blocks = rights // self.block_size
+
+        result = self._numpy_operation(self.suffix[lefts], self.prefix[rights])
+
+        inner = first_blocks + 1 < last_blocks
+        if inner.any():
+            result[inner] = self._numpy_operation(
+                result[inner], self.block_table.get_minimum_many(first_blocks[inner] + 1, last_blocks[inner] - 1))
+
+        same_block = first_blocks == last_blocks
+        if same_block.any():
+            result[same_block] = self._scan_many(lefts[same_block], rights[same_block])
+
+        return result
+
+    def _scan(self, index1, index2):
+        # Отрезок внутри одного блока: не более block_size элементов. Начальное значение
+        # op(x, x) дает тот же результат на отрезке длины 1, что и SparseTable (например, для gcd)
+        first = self.values[index1]
+        if self.backend == "numpy":
+            return self._numpy_operation(first, self._numpy_operation.reduce(self.values[index1:index2 + 1])).item()
+        return functools.reduce(self._python_operation, self.values[index1:index2 + 1], first)
+
+    def _scan_many(self, lefts, rights):
+        result = self._numpy_operation(self.values[lefts], self.values[lefts])
+        for offset in range(1, self.block_size):
+            positions = lefts + offset
+            active = positions <= rights
+            if not active.any():
+                break
+            result[active] = self._numpy_operation(result[active], self.values[positions[active]])
+        return result
+
+    def _build_numpy_blocks(self):
+        prefix = np.empty_like(self.values)
+        suffix = np.empty_like(self.values)
+
+        full_blocks = self.columns_number // self.block_size
+        full_length = full_blocks * self.block_size
+        if full_blocks > 0:
+            blocks = self.values[:full_length].reshape(full_blocks, self.block_size)
+            prefix[:full_length] = self._numpy_operation.accumulate(blocks, axis=1).ravel()
+            suffix[:full_length] = self._numpy_operation.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+        if full_length < self.columns_number:
+            tail = self.values[full_length:]
+            prefix[full_length:] = self._numpy_operation.accumulate(tail)
+            suffix[full_length:] = self._numpy_operation.accumulate(tail[::-1])[::-1]
+
+        return prefix, suffix
+
+    def _build_python_blocks(self):
+        prefix = self.values[:]
+        suffix = self.values[:]
+
+        for block_start in range(0, self.columns_number, self.block_size):
+            block_end = min(block_start + self.block_size, self.columns_number)
+            for i in range(block_start + 1, block_end):
+                prefix[i] = self._python_operation(prefix[i - 1], prefix[i])
+            for i in range(block_end - 2, block_start - 1, -1):
+                suffix[i] = self._python_operation(suffix[i], suffix[i + 1])
+
+        return prefix, suffix
+
+
+class DisjointSparseTable:
+    def __init__(self, array, use_numpy=True, operation="min"):
+        self.columns_number = len(array)
+        self.rows_number = (self.columns_number - 1).bit_length() + 1
+
+        self.operation = operation
+        self._python_operation = get_python_operation(operation, associative_python_operations)
+
+        # В numpy используются только именованные операции: все они коммутативны, поэтому
+        # суффиксы можно накапливать по развернутым блокам. Сумма и произведение целых
+        # накапливаются в int64, чтобы не переполнять int32
+        dtype_name = infer_dtype_name(array)
+        numpy_operation = None
+        if use_numpy and isinstance(operation, str):
+            numpy_operation = get_numpy_operation(operation, associative_numpy_operation_names)
+        if numpy_operation is not None and dtype_name is not None:
+            if operation in ("sum", "prod") and dtype_name == "int32":
+                dtype_name = "int64"
+            self.backend = "numpy"
+            self._numpy_operation = numpy_operation
+            self.dtype = np.dtype(dtype_name)
+            self.table = self._build_numpy_table(array)
+        else:
+            self.backend = "python"
+            self._numpy_operation = None
+            self.dtype = None
+            self.table = self._build_python_table(array)
+
+    def get_shapes(self):
+        return self.rows_number, self.columns_number
+
+    def get_cell_value(self, row, column):
+        value = self.table[row][column]
+        if self.backend == "numpy":
+            return value.item()
+        return value
+
+    def get_minimum(self, index1, index2):
+        if index1 > index2:
+            index1, index2 = index2, index1
+
+        if index1 == index2:
+            return self.get_cell_value(0, index1)
+
+        # Уровень, на котором index1 и index2 впервые попадают в разные половины одного блока
+        row = (index1 ^ index2).bit_length()
+        return self._python_operation(self.get_cell_value(row, index1), self.get_cell_value(row, index2))
+
+    def get_minimum_many(self, indexes1, indexes2):
+        lefts, rights = normalize_bounds(indexes1, indexes2, self.columns_number, self.backend == "numpy")
+        if self.backend != "numpy":
+            return [self.get_minimum(left, right) for left, right in zip(lefts, rights)]
+
+
+        # Показатель из frexp равен bit_length (точно для индексов меньше 2**53)
+        rows = np.frexp((lefts ^ rights).astype(np.float64))[1]
+        result = self._numpy_operation(self.table[rows, lefts], self.table[rows, rights])
+
+        single = lefts == rights
+        result[single] = self.table[0, lefts[single]]
+        return result
+
+    def _build_numpy_table(self, array):
+        table = np.empty((self.rows_number, self.columns_number), dtype=self.dtype)
+        table[0] = np.asarray(array, dtype=self.dtype)
+        values = table[0]
+
+        for row in range(1, self.rows_number):
+            block = 1 << row
+            half = block >> 1
+            full_blocks = self.columns_number // block
+            full_length = full_blocks * block
+
+            # В каждом блоке левая половина хранит суффиксы до середины, правая - префиксы от середины
+            if full_blocks > 0:
+                blocks = values[:full_length].reshape(full_blocks, block)
+                level = table[row, :full_length].reshape(full_blocks, block)
+                level[:, :half] = self._numpy_operation.accumulate(blocks[:, :half][:, ::-1], axis=1)[:, ::-1]
+                level[:, half:] = self._numpy_operation.accumulate(blocks[:, half:], axis=1)
+
+            if full_length < self.columns_number:
+                middle = min(full_length + half, self.columns_number)
+                table[row, full_length:middle] = self._numpy_operation.accumulate(values[full_length:middle][::-1])[::-1]
+                if middle < self.columns_number:
+                    table[row, middle:] = self._numpy_operation.accumulate(values[middle:])
+
+        return table
+
+    def _build_python_table(self, array):
+        values = list(array)
+        table = [values]
+
+        for row in range(1, self.rows_number):
+            block = 1 << row
+            half = block >> 1
+            level = [None] * self.columns_number
+
+            for block_start in range(0, self.columns_number, block):
+                middle = min(block_start + half, self.columns_number)
+                block_end = min(block_start + block, self.columns_number)
+
+                level[middle - 1] = values[middle - 1]
+                for i in range(middle - 2, block_start - 1, -1):
+                    level[i] = self._python_operation(values[i], level[i + 1])
+
+                if middle < block_end:
+                    level[middle] = values[middle]
+                    for i in range(middle + 1, block_end):
+                        level[i] = self._python_operation(level[i - 1], values[i])
+
+            table.append(level)
+
+        return table
+
+
+class MultiSeriesSparseTable:
+    # Таблица сразу для m рядов одной длины n: вход - двумерный массив n × m, где столбец -
+    # отдельный ряд. Уровень k хранится одним непрерывным блоком (n - 2^k + 1) × m, поэтому
+    # запрос читает две строки блока подряд и отвечает сразу для всех рядов
+    def __init__(self, array, use_numpy=True, operation="min"):
+        self.operation = operation
+        self._python_operation = get_python_operation(operation)
+
+        numpy_operation = get_numpy_operation(operation) if use_numpy else None
+        if is_numpy_array(array):
+            if array.ndim != 2:
+                raise ValueError("Ожидается двумерный массив n × m")
+            dtype_name = array.dtype.name if array.dtype.kind in "iuf" else None
+            rows = array if numpy_operation is not None and dtype_name is not None else array.tolist()
+        else:
+            rows = [list(row) for row in array]
+            if len({len(row) for row in rows}) > 1:
+                raise ValueError("Все строки массива должны иметь одинаковую длину")
+            dtype_name = infer_dtype_name([value for row in rows for value in row])
+
+        self.columns_number = len(rows)
+        self.series_number = len(rows[0]) if self.columns_number > 0 else 0
+        if self.columns_number == 0 or self.series_number == 0:
+            raise ValueError("Массив пуст")
+        self.rows_number = self.columns_number.bit_length()
+
+        if numpy_operation is not None and dtype_name is not None:
+            self.backend = "numpy"
+            self._numpy_operation = numpy_operation
+            self.dtype = np.dtype(dtype_name)
+            self.table = self._build_numpy_table(rows)
+        else:
+            self.backend = "python"
+            self._numpy_operation = None
+            self.dtype = None
+            self.table = self._build_python_table(rows)
+
+    @classmethod
+    def from_series(cls, series, use_numpy=True, operation="min"):
+        # Отдельные ряды (по одному списку на ряд) становятся столбцами
+        if use_numpy and load_numpy() is not None:
+            return cls(np.column_stack([np.asarray(values) for values in series]), use_numpy, operation)
+        return cls([list(row) for row in zip(*series)], use_numpy, operation)
+
+    def get_shapes(self):
+        return self.rows_number, self.columns_number
+
+    def get_minimum(self, index1, index2, columns=None):
+        if index1 > index2:
+            index1, index2 = index2, index1
+        if index1 < 0 or index2 >= self.columns_number:
+            raise IndexError("Границы интервала выходят за пределы массива")
+
+        level = (index2 - index1 + 1).bit_length() - 1
+        first = self.table[level][index1]
+        second = self.table[level][index2 - (1 << level) + 1]
+
+        if self.backend == "numpy":
+            if columns is not None:
+                columns = np.asarray(columns, dtype=np.intp)
+                first, second = first[columns], second[columns]
+            return self._numpy_operation(first, second)
+
+        if columns is not None:
+            first = [first[column] for column in columns]
+            second = [second[column] for column in columns]
+        return list(map(self._python_operation, first, second))
+
+    def get_minimum_many(self, indexes1, indexes2, columns=None):
+        # Результат - матрица: строка на запрос, столбец на ряд
+        lefts, rights = normalize_bounds(indexes1, indexes2, self.columns_number, self.backend == "numpy")
+        if self.backend != "numpy":
+            return [self.get_minimum(left, right, columns) for left, right in zip(lefts, rights)]
+
+        columns = np.arange(self.series_number) if columns is None else np.asarray(columns, dtype=np.intp)
+        result = np.empty((len(lefts), len(columns)), dtype=self.dtype)
+        if len(lefts) == 0:
+            return result
+
+        # Запросы одного уровня выполняются одной выборкой из его блока
+        levels = np.frexp((rights - lefts + 1).astype(np.float64))[1] - 1
+        for level in np.unique(levels):
+            positions = np.flatnonzero(levels == level)
+            block = self.table[level]
+            result[positions] = self._numpy_operation(
+                block[lefts[positions][:, None], columns],
+                block[(rights[positions] - (1 << int(level)) + 1)[:, None], columns])
+        return result
+
+    def _build_numpy_table(self, array):
+        table = [np.array(array, dtype=self.dtype, order="C")]
+        for row in range(1, self.rows_number):
+            half = 1 << (row - 1)
+            previous = table[-1]
+            level = np.empty((self.columns_number - (1 << row) + 1, self.series_number), dtype=self.dtype)
+            self._numpy_operation(previous[:len(level)], previous[half:half + len(level)], out=level)
+            table.append(level)
+        return table
+
+    def _build_python_table(self, rows):
+        table = [rows]
+        for row in range(1, self.rows_number):
+            half = 1 << (row - 1)
+            previous = table[-1]
+            table.append([list(map(self._python_operation, previous[column], previous[column + half]))
+                          for column in range(self.columns_number - (1 << row) + 1)])
+        return table
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from query_server import LocalClient, QueryClient, QueryServer
+from sparse_table import BlockSparseTable, DisjointSparseTable, MultiSeriesSparseTable, SparseTable
+
+np = pytest.importorskip("numpy")
+
+# Все числовые типы numpy, включая не имеющие прямого аналога в модуле array
+numeric_dtypes = ["int8", "uint8", "int16", "uint16", "int32", "uint32", "int64", "uint64",
+                  "float16", "float32", "float64"]
+
+
+@pytest.mark.parametrize("dtype", numeric_dtypes)
+@pytest.mark.parametrize("options", [
+    {"use_numpy": False, "compact": True},
+    {"use_numpy": False, "lazy": True},
+    {"operation": lambda first, second: min(first, second), "compact": True},
+])
+def test_python_typed_storage_accepts_numpy_dtypes(dtype, options):
+    array = np.array([5, 3, 8, 1, 7, 2, 9], dtype=dtype)
+    table = SparseTable(array, **options)
+    assert table.get_minimum(0, 2) == 3
+    assert table.get_minimum(2, 6) == 1
+
+
+@pytest.mark.parametrize("dtype", numeric_dtypes)
+def test_block_table_accepts_numpy_dtypes(dtype):
+    array = np.array([5, 3, 8, 1, 7, 2, 9], dtype=dtype)
+    assert BlockSparseTable(array, block_size=2, use_numpy=False).get_minimum(1, 6) == 1
+
+
+@pytest.mark.parametrize("dtype", numeric_dtypes)
+@pytest.mark.parametrize("return_index", [False, True])
+def test_saved_table_opens_without_numpy(tmp_path, dtype, return_index):
+    array = np.array([5, 3, 8, 1, 7, 2, 9], dtype=dtype)
+    path = tmp_path / "table.sptb"
+    SparseTable(array, return_index=return_index).save(path)
+
+    for use_numpy in (True, False):
+        table = SparseTable.open(path, use_numpy=use_numpy)
+        assert table.get_minimum(2, 6) == (3 if return_index else 1)
+        table.close()
+
+
+@pytest.mark.parametrize("dtype", ["float32", "uint16"])
+def test_shared_table_attaches_without_numpy(dtype):
+    table = SparseTable(np.array([5, 3, 8, 1, 7, 2, 9], dtype=dtype))
+    attached = SparseTable.attach(table.share(), use_numpy=False)
+    assert attached.get_minimum(0, 2) == 3
+    attached.close()
+    table.close()
+
+
+def query_local_server(table, lefts, rights):
+    async def query():
+        return await LocalClient(QueryServer({"table": table})).query("table", lefts, rights)
+    return asyncio.run(query())
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_server_returns_float32_answers(use_numpy):
+    table = SparseTable(np.array([1.5, 2.25, 0.75, 3.5], dtype=np.float32), use_numpy=use_numpy)
+    assert query_local_server(table, [0, 1], [3, 1]).tolist() == [0.75, 2.25]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_server_returns_uint64_answers(use_numpy):
+    table = SparseTable(np.array([2**63 + 5, 2**63 + 9, 7], dtype=np.uint64), use_numpy=use_numpy)
+    assert query_local_server(table, [0, 0], [1, 2]).tolist() == [2**63 + 5, 7]
+
+
+class FailingTable:
+    columns_number = 4
+
+    def get_minimum_many(self, indexes1, indexes2):
+        raise RuntimeError("сбой таблицы")
+
+
+def test_server_reports_unexpected_errors_and_keeps_connection(tmp_path):
+    async def run():
+        server = QueryServer({"failing": FailingTable(), "table": SparseTable([5, 3, 8, 1])})
+        await server.start_unix(str(tmp_path / "server.sock"))
+        client = await QueryClient.connect_unix(str(tmp_path / "server.sock"))
+        try:
+            with pytest.raises(ValueError, match="сбой таблицы"):
+                await asyncio.wait_for(client.query("failing", [0], [3]), 5)
+            answers = await asyncio.wait_for(client.query("table", [0], [3]), 5)
+        finally:
+            await client.close()
+            await server.close()
+        return answers.tolist()
+
+    assert asyncio.run(run()) == [1]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_batch_queries_check_bounds(use_numpy):
+    table = SparseTable([5, 3, 8, 1], use_numpy=use_numpy)
+    assert list(table.get_minimum_many([3, 0], [0, 1])) == [1, 3]
+    with pytest.raises(ValueError):
+        table.get_minimum_many([0, 1], [3])
+    with pytest.raises(IndexError):
+        table.get_minimum_many([-1], [2])
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("factory", [BlockSparseTable, DisjointSparseTable,
+                                     lambda array, use_numpy: MultiSeriesSparseTable([[value] for value in array],
+                                                                                     use_numpy)])
+def test_other_tables_check_batch_bounds(factory, use_numpy):
+    table = factory([5, 3, 8, 1], use_numpy=use_numpy)
+    with pytest.raises(ValueError):
+        table.get_minimum_many([0, 1], [3])
+    with pytest.raises(IndexError):
+        table.get_minimum_many([0], [4])